@@ -0,0 +1,63 @@
+"""
+Misura quanti pacchetti al secondo vengono codificati
+e decodificati per ogni `Packet.Type`
+
+    python -m benchmark.packet_bench [--number N]
+"""
+import argparse
+import random
+import timeit
+
+from pyxbee import Packet
+
+
+def sample(tipo):
+    """Pacchetto di esempio con valori casuali coerenti col protocollo"""
+    res = dict()
+    for key, kind in Packet._PACKETS[tipo].items():
+        if key == 'dest':
+            res[key] = 'X'
+        elif key == 'type':
+            res[key] = tipo
+        elif kind == 'bool':
+            res[key] = bool(random.randint(0, 1))
+        elif kind == 'int':
+            res[key] = str(random.randint(0, 100))
+        else:
+            res[key] = str(round(random.random() * 100, 3))
+    return res
+
+
+def bench(number):
+    results = dict()
+    for name in ('DATA', 'STATE', 'NOTICE', 'SETTING',
+                 'SIGNAL', 'MESSAGE', 'RASPBERRY', 'VIDEO'):
+        tipo = getattr(Packet.Type, name)
+        content = sample(tipo)
+        raw = Packet(content).encode
+
+        cases = {
+            'decode': lambda: Packet(raw),
+            'load': lambda: Packet(content),
+            'encode': lambda: Packet(content).encode,
+        }
+        results[name] = {case: number / min(timeit.repeat(func, number=number, repeat=5))
+                         for case, func in cases.items()}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    Packet.secret_key = None
+    results = bench(args.number)
+
+    print(f'{"type":<10}' + ''.join(f'{case:>14}' for case in ('decode', 'load', 'encode')))
+    for name, res in results.items():
+        print(f'{name:<10}' + ''.join(f'{pps:>10.0f} p/s' for pps in res.values()))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 import re
 
+from .aio import AsyncClient, AsyncServer
 from .base import Bike, Client, Server, Taurus
 from .const import PROTOCOL
 from .packet import Packet
@@ -12,11 +13,14 @@ with open('pyproject.toml', 'r') as f:
 
 
 __all__ = [
+    'AsyncClient',
+    'AsyncServer',
     'Bike',
     'Client',
     'Server',
     'Taurus',
     'Packet',
+    'aio',
     'base',
     'packet',
     'exception',
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+
+from .base import Client, Server
+from .const import RELIABLE_WINDOW
+from .packet import Packet
+
+log = logging.getLogger(__name__)
+
+
+class _Bridge:
+    """
+    Porta i pacchetti dal thread di lettura di digi-xbee
+    in una coda asyncio del loop indicato.
+    Se la coda e' piena viene scartato il pacchetto piu' vecchio
+
+    :param loop: `asyncio.AbstractEventLoop`
+    :param maxsize: `int`
+        Dimensione massima della coda, `0` per nessun limite
+    """
+
+    def __init__(self, loop, maxsize):
+        self._loop = loop
+        self._maxsize = maxsize
+        self._queue = None
+        self.dropped = 0
+
+    @property
+    def queue(self):
+        # creata nel loop: fino a python 3.9 la coda si lega
+        # al loop corrente al momento della creazione
+        if self._queue is None:
+            self._queue = asyncio.Queue(self._maxsize)
+        return self._queue
+
+    def put(self, packet):
+        # chiamato dal thread di digi-xbee
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._put, packet)
+
+    def _put(self, packet):
+        queue = self.queue
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(packet)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def qsize(self):
+        return self._queue.qsize() if self._queue else 0
+
+
+class _BridgedServer(Server):
+
+    def __init__(self, bridge, *args, **kwargs):
+        self._bridge = bridge
+        super().__init__(*args, **kwargs)
+
+    def manage_packet(self, packet):
+        packet = super().manage_packet(packet)
+        if packet is not None:
+            self._bridge.put(packet)
+        return packet
+
+
+class _BridgedClient(Client):
+
+    def __init__(self, bridge, *args, **kwargs):
+        self._bridge = bridge
+        super().__init__(*args, **kwargs)
+
+    def manage_packet(self, packet):
+        packet = super().manage_packet(packet)
+        if packet is not None:
+            self._bridge.put(packet)
+        return packet
+
+
+class _AsyncTransmitter:
+    """
+    Versione asyncio del transmitter: `send` viene eseguito in
+    un executor, `send_sync` aspetta il transmit status con
+    l'invio affidabile a finestra (`send_reliable`) senza
+    occupare thread, e i pacchetti ricevuti si leggono con
+    `async for packet in transmitter`.
+
+    Il transmitter sincrono, da passare a `Taurus` o `Bike`,
+    e' disponibile in `transmitter`; i listener continuano
+    a ricevere i pacchetti come prima
+
+    :param loop: `asyncio.AbstractEventLoop`
+        Loop su cui vengono consegnati i pacchetti ricevuti
+        DEFAULT: il loop corrente
+    :param maxsize: `int`
+        Pacchetti ricevuti in attesa di essere letti, oltre
+        viene scartato il piu' vecchio. `0` per nessun limite
+        DEFAULT: `0`
+    :param executor: `concurrent.futures.Executor`
+        Executor in cui vengono eseguiti gli invii
+        DEFAULT: l'executor di default del loop
+
+    Gli altri parametri sono quelli del transmitter sincrono,
+    `window` vale `RELIABLE_WINDOW` se non viene passato
+    """
+
+    _TRANSMITTER = None
+
+    def __init__(self, *args, loop=None, maxsize=0, executor=None, **kwargs):
+        self._loop = loop or asyncio.get_event_loop()
+        self._executor = executor
+        self._bridge = _Bridge(self._loop, maxsize)
+        kwargs.setdefault('window', RELIABLE_WINDOW)
+        self._transmitter = self._TRANSMITTER(self._bridge, *args, **kwargs)
+
+    @property
+    def transmitter(self):
+        return self._transmitter
+
+    @property
+    def address(self):
+        return self.transmitter.address
+
+    @property
+    def dropped(self):
+        """Pacchetti ricevuti scartati perche' la coda era piena"""
+        return self._bridge.dropped
+
+    def close(self):
+        self.transmitter.close()
+
+    def _run(self, func, *args):
+        return self._loop.run_in_executor(self._executor, func, *args)
+
+    @staticmethod
+    def _packet(packet):
+        return packet if isinstance(packet, Packet) else Packet(packet)
+
+    # DIREZIONE: verso l'antenna remota
+
+    async def send(self, address, packet):
+        await self._run(self.transmitter.send, address, self._packet(packet))
+
+    async def send_sync(self, address, packet):
+        """Aspetta l'ack senza bloccare il loop,
+        ritorna `False` se non arriva
+        """
+        future = self.transmitter.send_reliable(address, self._packet(packet))
+        return await asyncio.wrap_future(future, loop=self._loop)
+
+    async def send_broadcast(self, packet):
+        await self._run(self.transmitter.send_broadcast, self._packet(packet))
+
+    # DIREZIONE: dall'antenna remota
+
+    async def receive(self):
+        """Aspetta il prossimo pacchetto ricevuto"""
+        return await self._bridge.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._bridge.get()
+
+
+class AsyncServer(_AsyncTransmitter):
+    """SERVER mode del transmitter asyncio"""
+
+    _TRANSMITTER = _BridgedServer
+
+    @property
+    def listener(self):
+        return self.transmitter.listener
+
+    @property
+    def web(self):
+        return self.transmitter.web
+
+    @web.setter
+    def web(self, web):
+        self.transmitter.web = web
+
+
+class AsyncClient(_AsyncTransmitter):
+    """CLIENT mode del transmitter asyncio"""
+
+    _TRANSMITTER = _BridgedClient
+
+    @property
+    def bike(self):
+        return self.transmitter.bike
@@ -1,21 +1,50 @@
 import logging
+import threading
 
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
 
 from digi.xbee.devices import RemoteXBeeDevice, XBeeDevice
 from digi.xbee.exception import (InvalidOperatingModeException,
                                  InvalidPacketException, TimeoutException)
-from digi.xbee.models.address import XBee64BitAddress
+from digi.xbee.models.address import XBee16BitAddress, XBee64BitAddress
+from digi.xbee.models.options import TransmitOptions
+from digi.xbee.models.protocol import XBeeProtocol
+from digi.xbee.models.status import TransmitStatus
+from digi.xbee.packets.aft import ApiFrameType
+from digi.xbee.packets.common import TransmitPacket
+from digi.xbee.packets.raw import TX64Packet
 from serial.serialutil import SerialException
 from ordered_set import OrderedSet
 
-from .const import PORT, BAUD_RATE
-from .packet import Packet
+from itertools import count
+
+from .codec import KEYFRAME_FLAG, is_delta
+from .const import (PORT, BAUD_RATE, MAX_PAYLOAD, FLUSH_INTERVAL,
+                    KEYFRAME_INTERVAL, FRAGMENT_TIMEOUT, RECEIVE_QUEUE,
+                    RELIABLE_RETRIES)
+from .frame import (Aggregator, Reassembler, fragment, is_aggregate,
+                    is_fragment, split)
+from .packet import Packet, DeltaEncoder
+from .reliable import ReliableSender, gather
+from .scheduler import Scheduler
+from .worker import DROP_OLDEST, ReceiveQueue
 from .exception import (InvalidInstanceException, PacketInstanceException,
                         InvalidCodeException, InvalidDigest)
 
 log = logging.getLogger(__name__)
 
+# tipo dei keyframe nella coda di ricezione: senza il keyframe
+# i delta successivi non si possono ricostruire
+_KEYFRAME = 'keyframe'
+
+
+def _peek(data):
+    if is_delta(data) and len(data) > 1 and data[1] & KEYFRAME_FLAG:
+        return _KEYFRAME
+    return Packet.peek_type(data)
+
 
 class _Transmitter(ABC):
     """
@@ -32,19 +61,187 @@ class _Transmitter(ABC):
     :param baud_rate: `int`
         Baud rate scelto per lo xbee
         DEFAULT: `115200`
+    :param binary: `bool`
+        Invia i pacchetti nel formato binario compatto,
+        in ricezione il formato viene riconosciuto
+        automaticamente
+        DEFAULT: `False`
+    :param aggregate: `bool`
+        Unisce i pacchetti diretti allo stesso indirizzo
+        in un solo frame; in ricezione i frame aggregati
+        vengono sempre riconosciuti
+        DEFAULT: `False`
+    :param max_payload: `int`
+        Payload massimo di un frame dell'antenna
+        DEFAULT: `100`
+    :param flush_interval: `float`
+        Attesa massima di un pacchetto aggregato (s)
+        DEFAULT: `0.005`
+    :param delta: `bool`
+        Invia i pacchetti DATA come delta rispetto all'ultimo
+        keyframe confermato dall'ack dell'antenna remota.
+        I keyframe partono con l'invio affidabile senza
+        bloccare, che viene attivato anche con `window` a `0`
+        DEFAULT: `False`
+    :param keyframe_interval: `int`
+        Numero massimo di delta tra due keyframe
+        DEFAULT: `50`
+    :param fragment_timeout: `float`
+        I pacchetti piu' grandi di `max_payload` vengono
+        frammentati; un pacchetto i cui frammenti non arrivano
+        tutti entro questo tempo (s) viene scartato
+        DEFAULT: `2.0`
+    :param workers: `int`
+        Se maggiore di zero il callback di digi-xbee si limita
+        ad accodare i pacchetti ricevuti, decodificati e gestiti
+        da `workers` thread; con `0` vengono gestiti direttamente
+        nel thread di lettura dell'antenna
+        DEFAULT: `0`
+    :param receive_queue: `int`
+        Pacchetti ricevuti in attesa dei worker
+        DEFAULT: `256`
+    :param overflow: `str`
+        Politica con la coda piena, `'drop_oldest'` o
+        `'drop_newest'`; i tipi protetti non vengono mai scartati
+        DEFAULT: `'drop_oldest'`
+    :param schedule: `bool`
+        `send` accoda i pacchetti in uno scheduler che li invia
+        in ordine di priorita' del tipo, con i limiti di banda
+        e tenendo solo l'ultimo DATA e STATE in coda
+        per ogni indirizzo. `send_sync` non passa dalla coda
+        DEFAULT: `False`
+    :param priorities: `dict`
+        `tipo -> priorita'` dello scheduler, zero e' la piu' alta
+        DEFAULT: `SEND_PRIORITY`
+    :param rate_limits: `dict`
+        `tipo -> (pacchetti al secondo, raffica)` dello scheduler
+        DEFAULT: `None`
+    :param address_rate: `tuple`
+        `(pacchetti al secondo, raffica)` per ogni indirizzo
+        DEFAULT: `None`
+    :param window: `int`
+        Frame di `send_reliable` in volo contemporaneamente,
+        confermati dal transmit status dell'antenna. Con `0`
+        `send_reliable` aspetta ogni ack come `send_sync`
+        DEFAULT: `0`
+    :param retries: `int`
+        Nuovi tentativi di un frame di `send_reliable` fallito
+        DEFAULT: `3`
     """
 
-    def __init__(self, port=PORT, baud_rate=BAUD_RATE):
+    # transmitter condivisi nel processo, uno per porta e baud rate
+    _SHARED = dict()
+    _SHARED_LOCK = threading.RLock()
+
+    def __init__(self, port=PORT, baud_rate=BAUD_RATE, binary=False,
+                 aggregate=False, max_payload=MAX_PAYLOAD, flush_interval=FLUSH_INTERVAL,
+                 delta=False, keyframe_interval=KEYFRAME_INTERVAL,
+                 fragment_timeout=FRAGMENT_TIMEOUT, workers=0,
+                 receive_queue=RECEIVE_QUEUE, overflow=DROP_OLDEST, schedule=False,
+                 priorities=None, rate_limits=None, address_rate=None,
+                 window=0, retries=RELIABLE_RETRIES):
         self._nonce = -1
+        self._nonce_lock = threading.Lock()
         self._device = None
+        self._aggregator = None
+        self._workers = None
+        self._scheduler = None
+        self._reliable = None
+
+        # indirizzi gia' convertiti e antenne remote,
+        # risolti una volta sola per destinazione
+        self._addresses = dict()
+        self._remotes = dict()
+
+        self._fragment_id = count()
+        self._reassembler = Reassembler(fragment_timeout)
+
+        # un encoder delta per ogni destinazione
+        self._delta = delta
+        self._keyframe_interval = keyframe_interval
+        self._encoders = dict()
 
         self._port = port
         self._baud_rate = baud_rate
+        self._binary = binary
+        self._max_payload = max_payload
+
+        if workers:
+            self._workers = ReceiveQueue(self._receive_packet, _peek, workers,
+                                         receive_queue, overflow,
+                                         Packet._PROTECTED + (_KEYFRAME,),
+                                         Packet.Type.DATA)
 
         self._open_device(port, baud_rate)
 
+        if window or delta:
+            self._reliable = ReliableSender(self._transmit, max(window, 1), retries)
+
+        if schedule:
+            self._scheduler = Scheduler(self._send_packet, priorities,
+                                        rate_limits, address_rate)
+
+        if aggregate:
+            self._aggregator = Aggregator(self._send_frame, max_payload, flush_interval)
+
     def __del__(self):
+        self.close()
+
+    @classmethod
+    def shared(cls, port=PORT, baud_rate=BAUD_RATE, **kwargs):
+        """Ritorna il transmitter gia' aperto sulla stessa porta o,
+        se non c'e', ne crea uno con i parametri `kwargs`.
+        Viene condiviso solo un transmitter con l'antenna aperta:
+        se l'antenna non viene trovata, la chiamata successiva
+        riprova ad aprirla. Una porta gia' condivisa da un
+        transmitter di un'altra modalita' solleva
+        `InvalidInstanceException`
+
+        :param port: `str`
+            DEFAULT: '/dev/ttyUSB0'
+        :param baud_rate: `int`
+            DEFAULT: `115200`
+        """
+        key = (port, baud_rate)
+        with _Transmitter._SHARED_LOCK:
+            transmitter = _Transmitter._SHARED.get(key)
+            if transmitter is not None and transmitter.device is not None \
+                    and transmitter.device.is_open():
+                if not isinstance(transmitter, cls):
+                    raise InvalidInstanceException
+                return transmitter
+
+            transmitter = cls(port, baud_rate, **kwargs)
+            if transmitter.device is not None:
+                _Transmitter._SHARED[key] = transmitter
+            else:
+                _Transmitter._SHARED.pop(key, None)
+        return transmitter
+
+    def close(self):
+        with _Transmitter._SHARED_LOCK:
+            key = (self._port, self._baud_rate)
+            if _Transmitter._SHARED.get(key) is self:
+                del _Transmitter._SHARED[key]
+
+        if self._scheduler is not None:
+            self._scheduler.close()
+            self._scheduler = None
+
+        if self._reliable is not None:
+            self._reliable.close()
+            self._reliable = None
+
+        if self._workers is not None:
+            self._workers.close()
+            self._workers = None
+
+        if self._aggregator:
+            self._aggregator.close()
+            self._aggregator = None
+
         if self._device:
+            self._remotes.clear()
             if self._device.is_open():
                 self._device.close()
                 log.info(f'Device ({self._device.get_64bit_addr()}) closed')
@@ -54,6 +251,7 @@ class _Transmitter(ABC):
         try:
             device.open()
             device.add_data_received_callback(self.receiver)
+            device.add_packet_received_callback(self._transmit_status)
             log.info(f'Device ({device.get_64bit_addr()}) connected\n')
             self._device = device
         except (InvalidOperatingModeException, SerialException):
@@ -75,12 +273,109 @@ class _Transmitter(ABC):
     def baud_rate(self):
         return self._baud_rate
 
+    @property
+    def binary(self):
+        return self._binary
+
+    @property
+    def max_payload(self):
+        return self._max_payload
+
+    @property
+    def receive_queue(self):
+        """Coda dei pacchetti ricevuti, con i contatori di
+        profondita' e scarti. `None` senza worker
+        """
+        return self._workers
+
+    @property
+    def scheduler(self):
+        """Coda di invio, `None` se non e' abilitata"""
+        return self._scheduler
+
+    def register(self, *addresses):
+        """Risolve in anticipo gli indirizzi delle antenne
+        remote note, ad esempio all'avvio. Un indirizzo non
+        valido solleva `ValueError`
+        """
+        for address in addresses:
+            self._address(address)
+            if self.device:
+                self._remote(address)
+
+    def _address(self, address):
+        res = self._addresses.get(address)
+        if res is None:
+            res = self._addresses[address] = XBee64BitAddress.from_hex_string(address)
+        return res
+
+    def _remote(self, address):
+        remote = self._remotes.get(address)
+        if remote is None:
+            remote = RemoteXBeeDevice(self.device, self._address(address))
+            self._remotes[address] = remote
+        return remote
+
+    def _encode(self, packet):
+        if self.binary:
+            return packet.encode_binary
+        return packet.encode.encode('utf-8')
+
     # DIREZIONE: server --> bici
 
     def send(self, address, packet):
+        if self._scheduler is not None:
+            self._scheduler.put(address, packet)
+        else:
+            self._send_packet(address, packet)
+
+    def _send_packet(self, address, packet):
+        if self._delta and packet.tipo == Packet.Type.DATA:
+            self._send_delta(address, packet)
+        else:
+            self._send_data(address, self._encode(packet))
+
+    def _send_delta(self, address, packet):
+        encoder = self._encoders.get(address)
+        if encoder is None:
+            encoder = self._encoders[address] = DeltaEncoder(self._keyframe_interval)
+
+        seq, keyframe, frame = encoder.encode(packet)
+        if not keyframe:
+            self._send_data(address, frame)
+            return
+
+        # il keyframe diventa il riferimento solo quando
+        # arriva l'ack, senza fermare gli invii successivi
+        def done(future):
+            if future.result():
+                encoder.ack(seq)
+            else:
+                encoder.fail(seq)
+
+        self._send_reliable(address, frame).add_done_callback(done)
+
+    def _send_data(self, address, data):
+        if len(data) > self.max_payload:
+            self._send_fragments(address, data)
+        elif self._aggregator:
+            self._aggregator.put(address, data)
+        else:
+            self._send_frame(address, data)
+
+    def _fragment(self, address, data):
+        # i pacchetti aggregati in attesa partono prima
+        if self._aggregator:
+            self._aggregator.flush(address)
+        return fragment(data, self.max_payload, next(self._fragment_id))
+
+    def _send_fragments(self, address, data):
+        for frame in self._fragment(address, data):
+            self._send_frame(address, frame)
+
+    def _send_frame(self, address, data):
         try:
-            self.device.send_data_async(RemoteXBeeDevice(
-                self.device, XBee64BitAddress.from_hex_string(address)), packet.encode)
+            self.device.send_data_async(self._remote(address), data)
         except (TimeoutException, InvalidPacketException):
             log.error(f'({address}) not found\n')
         except AttributeError:
@@ -89,37 +384,123 @@ class _Transmitter(ABC):
     def send_sync(self, address, packet):
         """Aspetta l'ack, se scatta il
         timeout e non riceve risposta
-        lancia l'eccezione
+        ritorna `False`
         """
+        return self._send_frame_sync(address, self._encode(packet))
+
+    def _send_frame_sync(self, address, data):
+        if len(data) > self.max_payload:
+            return all(self._send_frame_sync(address, frame)
+                       for frame in self._fragment(address, data))
+
+        # i pacchetti aggregati in attesa partono prima
+        if self._aggregator:
+            self._aggregator.flush(address)
+
         try:
-            self.device.send_data(RemoteXBeeDevice(
-                self.device, XBee64BitAddress.from_hex_string(address)), packet.encode)
+            self.device.send_data(self._remote(address), data)
+            return True
         except (TimeoutException, InvalidPacketException):
             log.error('ACK send_sync not received\n')
         except AttributeError:
             log.error('SEND_SYNC: Antenna not connected\n')
+        return False
+
+    def send_reliable(self, address, packet):
+        """Invia il pacchetto senza aspettare l'ack e ritorna
+        un `concurrent.futures.Future` che vale `True` alla
+        conferma dell'antenna remota, `False` se non arriva
+        dopo tutti i tentativi. Piu' invii restano in volo
+        contemporaneamente, fino a `window`
+        """
+        data = self._encode(packet)
+        if self._reliable is None:
+            future = Future()
+            future.set_result(self._send_frame_sync(address, data))
+            return future
+        return self._send_reliable(address, data)
+
+    def _send_reliable(self, address, data):
+        if len(data) > self.max_payload:
+            return gather([self._reliable.send(address, frame)
+                           for frame in self._fragment(address, data)])
+
+        # i pacchetti aggregati in attesa partono prima
+        if self._aggregator:
+            self._aggregator.flush(address)
+        return self._reliable.send(address, data)
+
+    def _transmit(self, address, data):
+        """Invia il frame senza aspettare e ne ritorna il frame ID"""
+        device = self.device
+        frame_id = device.get_next_frame_id()
+        if device.get_protocol() == XBeeProtocol.RAW_802_15_4:
+            packet = TX64Packet(frame_id, self._address(address),
+                                TransmitOptions.NONE.value, rf_data=data)
+        else:
+            packet = TransmitPacket(frame_id, self._address(address),
+                                    XBee16BitAddress.UNKNOWN_ADDRESS, 0,
+                                    TransmitOptions.NONE.value, rf_data=data)
+        device.send_packet(packet)
+        return frame_id
+
+    def _transmit_status(self, packet):
+        if self._reliable is not None and packet.get_frame_type() in (
+                ApiFrameType.TRANSMIT_STATUS, ApiFrameType.TX_STATUS):
+            self._reliable.status(packet.frame_id,
+                                  packet.transmit_status == TransmitStatus.SUCCESS)
 
     def send_broadcast(self, packet):
-        self.device.send_data_broadcast(packet.encode)
+        data = self._encode(packet)
+        frames = [data]
+        if len(data) > self.max_payload:
+            frames = fragment(data, self.max_payload, next(self._fragment_id))
+
+        for frame in frames:
+            self.device.send_data_broadcast(frame)
 
     # DIREZIONE: bici --> server
 
     def receiver(self, xbee_message):
         if xbee_message != '':
-            raw = xbee_message.data.decode()
-            packet = Packet(raw)
-            log.debug(f'Received packet: {packet}')
+            data = bytes(xbee_message.data)
+            if is_fragment(data):
+                remote = getattr(xbee_message, 'remote_device', None)
+                source = str(remote.get_64bit_addr()) if remote else None
+                data = self._reassembler.feed(source, data)
+                if data is None:
+                    return
+
+            handle = self._workers.put if self._workers is not None else self._receive_packet
+            if is_aggregate(data):
+                for raw in split(data):
+                    handle(raw)
+            else:
+                handle(data)
 
-            if packet.tipo in packet.protected_type:
-                dig = packet.calculate_digest(packet.raw_data)
-                nonce = int(packet.nonce)
+    def _receive_packet(self, raw):
+        if raw:
+            # il contenuto viene decodificato solo quando serve
+            packet = Packet(raw, lazy=True)
+            log.debug('Received packet: %s', packet)
 
-                if dig == packet.digest and nonce > self._nonce:
+            if packet.tipo in packet.protected_type:
+                nonce = packet.nonce
+
+                # il nonce costa meno del digest, i replay
+                # vengono scartati senza calcolarlo
+                if nonce is None or nonce <= self._nonce or not packet.verify():
+                    # TODO: vogliamo che venga laciata un'eccezione?
+                    # raise InvalidDigest
+                    return
+
+                # con piu' worker il nonce va controllato e
+                # aggiornato in un'unica operazione
+                with self._nonce_lock:
+                    if nonce <= self._nonce:
+                        return
                     self._nonce = nonce
-                    self.manage_packet(packet)
-                # TODO: vogliamo che venga laciata un'eccezione?
-                # else:
-                #     raise InvalidDigest
+                self.manage_packet(packet)
             else:
                 self.manage_packet(packet)
 
@@ -159,6 +540,14 @@ class _SuperBike(ABC):
             packet = Packet(packet)
         self.transmitter.send(self.address, packet)
 
+    def send_reliable(self, packet):
+        """Ritorna un `Future` che vale `True` alla
+        conferma dell'antenna remota
+        """
+        if not isinstance(packet, Packet):
+            packet = Packet(packet)
+        return self.transmitter.send_reliable(self.address, packet)
+
 
 class Server(_Transmitter):
     """SERVER mode del transmitter"""
@@ -189,10 +578,17 @@ class Server(_Transmitter):
         if not isinstance(packet, Packet):
             raise PacketInstanceException
         dest = self.listener.get(packet.dest)
-        dest.receive(packet)
+        if dest is None:
+            log.debug('Listener %s not found', packet.dest)
+            return packet
+
+        # i delta vengono ricostruiti dal listener
+        packet = dest.receive(packet)
 
-        if self.web and packet.tipo == Packet.Type.DATA:
+        if self.web and packet is not None and packet.tipo == Packet.Type.DATA \
+                and packet.valid:
             self.web.send_data(packet.encode)
+        return packet
 
 
 class Taurus(_SuperBike):
@@ -204,12 +600,16 @@ class Taurus(_SuperBike):
 
     code --> codice con cui viene identif. nei pacchetti
     address --> indirizzo dell'antenna client
-    server --> instanza dell'antenna server
+    server --> instanza dell'antenna server, se manca viene
+               usato il server condiviso sulla porta `xbee_port`
     """
 
+    # keyframe conservati per ricostruire i delta
+    KEYFRAMES = 4
+
     def __init__(self, code, address, xbee_port=PORT, server=None, secret_key=None):
         if not server:
-            server = Server(port=xbee_port)
+            server = Server.shared(xbee_port)
 
         if secret_key:
             Packet.secret_key = secret_key
@@ -229,41 +629,112 @@ class Taurus(_SuperBike):
         # ricevuto per ogni tipo
         self._memoize = dict()
 
+        # json dei pacchetti memorizzati, invalidato
+        # solo alla ricezione di un nuovo pacchetto
+        self._json = dict()
+
+        # ultimi keyframe ricevuti, per ricostruire i delta
+        self._keyframes = OrderedDict()
+
+        # pacchetto sostituito dall'ultimo ricevuto, usato se
+        # l'ultimo alla decodifica risulta non valido
+        self._previous = dict()
+
     def __str__(self):
         return f'{self.code} -- {self.address}'
 
+    def _jsonify(self, tipo):
+        # il json e' salvato insieme al pacchetto da cui deriva:
+        # una ricezione concorrente non lascia in cache un json vecchio
+        packet = self._memoize.get(tipo)
+        if packet is not None and not packet.valid:
+            packet = self._discard(tipo)
+        cached = self._json.get(tipo)
+        if cached and cached[0] is packet:
+            return cached[1]
+        if not packet:
+            return {}
+        res = packet.jsonify
+        self._json[tipo] = (packet, res)
+        return res
+
+    def _discard(self, tipo):
+        """Il pacchetto ricevuto viene decodificato solo alla
+        prima lettura: se non e' valido viene scartato e
+        torna valido il pacchetto precedente
+        """
+        log.warning(f'{self.code}: invalid packet of type {tipo} discarded')
+        packet = self._previous.pop(tipo, None)
+        if packet is not None and packet.valid:
+            self._memoize[tipo] = packet
+            return packet
+        self._memoize.pop(tipo, None)
+        return None
+
     @property
     def history(self):
         return list(self._history)
 
     @property
     def data(self):
-        data = self._memoize.get(Packet.Type.DATA)
-        if data:
-            self._history.append(data.jsonify)
-        return data.jsonify if data else {}
+        cached = self._json.get(Packet.Type.DATA)
+        data = self._jsonify(Packet.Type.DATA)
+        if data and not (cached and cached[1] is data):
+            self._history.append(data)
+        return data
 
     @property
     def state(self):
-        state = self._memoize.get(Packet.Type.STATE)
-        return state.jsonify if state else {}
+        return self._jsonify(Packet.Type.STATE)
 
     @property
     def setting(self):
-        sett = self._memoize.get(Packet.Type.SETTING)
-        return sett.jsonify if sett else {}
+        return self._jsonify(Packet.Type.SETTING)
 
     @property
     def notice(self):
-        notice = self._memoize.get(Packet.Type.NOTICE)
-        return notice.jsonify if notice else {}
+        return self._jsonify(Packet.Type.NOTICE)
 
     # DIREZIONE: bici --> server
 
+    def _rebuild(self, packet):
+        """Ricostruisce il pacchetto completo da un delta,
+        `None` se il keyframe di riferimento non e' noto
+        """
+        key = (packet.tipo, packet.seq)
+        if packet.keyframe:
+            # un keyframe con la stessa sequenza (la sequenza e' ripartita
+            # o ha fatto il giro) sostituisce il precedente come piu' recente
+            self._keyframes.pop(key, None)
+            self._keyframes[key] = packet.content_dict
+            while len(self._keyframes) > self.KEYFRAMES:
+                self._keyframes.popitem(last=False)
+            return packet
+
+        reference = self._keyframes.get(key)
+        if reference is None:
+            log.debug(f'{self.code}: keyframe {packet.seq} not found')
+            return None
+
+        content = dict(reference)
+        content.update(packet.content_dict)
+        return Packet(content)
+
     def receive(self, packet):
         if not isinstance(packet, Packet):
             raise PacketInstanceException
+
+        if packet.seq is not None:
+            packet = self._rebuild(packet)
+            if packet is None:
+                return None
+
+        previous = self._memoize.get(packet.tipo)
+        if previous is not None:
+            self._previous[packet.tipo] = previous
         self._memoize.update({packet.tipo: packet})
+        self._json.pop(packet.tipo, None)
+        return packet
 
 
 class Client(_Transmitter):
@@ -290,7 +761,9 @@ class Client(_Transmitter):
     def manage_packet(self, packet):
         if not isinstance(packet, Packet):
             raise PacketInstanceException
-        self.bike.receive(packet)
+        if self.bike is not None:
+            self.bike.receive(packet)
+        return packet
 
 
 class Bike(_SuperBike):
@@ -302,12 +775,13 @@ class Bike(_SuperBike):
 
     code --> codice con cui viene identif. nei pacchetti
     address --> indirizzo dell'antenna server
-    client --> instanza dell'antenna client
+    client --> instanza dell'antenna client, se manca viene
+               usato il client condiviso sulla porta di default
     """
 
     def __init__(self, code, address, client=None, sensors=None, secret_key=None):
         if not client:
-            client = Client()
+            client = Client.shared()
 
         if secret_key:
             Packet.secret_key = secret_key
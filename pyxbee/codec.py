@@ -0,0 +1,446 @@
+import struct
+
+from operator import itemgetter
+
+from .exception import InvalidTypeException, InvalidFieldsException
+
+# Il primo byte di un pacchetto binario ha sempre il bit piu'
+# significativo alto: un pacchetto testuale inizia con un
+# carattere ascii, quindi i due formati non si confondono
+BINARY_FLAG = 0x80
+NONCE_FLAG = 0x40
+DIGEST_FLAG = 0x20
+TYPE_MASK = 0x1F
+
+# Frame delta: `DELTA | flag | seq | ...`, un keyframe contiene
+# il pacchetto binario completo, un delta solo i campi cambiati
+# rispetto al keyframe `seq`
+DELTA = 0x1C
+KEYFRAME_FLAG = 0x80
+
+DIGEST_SIZE = 16
+
+_NUMERIC = {'int': 'i', 'float': 'f', 'double': 'd'}
+
+_NONCE = struct.Struct('<I')
+_LEN = struct.Struct('<B')
+_LONG_LEN = struct.Struct('<H')
+_DELTA = struct.Struct('<BBH')
+
+_TEXT_BOOL = {'true': True, 'false': False}
+
+
+def is_binary(data):
+    """Ritorna `True` se `data` e' un pacchetto in formato binario"""
+    return isinstance(data, (bytes, bytearray)) and len(data) > 0 \
+        and bool(data[0] & BINARY_FLAG)
+
+
+def is_delta(data):
+    """Ritorna `True` se `data` e' un keyframe o un delta"""
+    return isinstance(data, (bytes, bytearray)) and len(data) > 0 \
+        and data[0] == DELTA
+
+
+def _to_bool(value):
+    if value is True or value is False:
+        return value
+    if isinstance(value, str):
+        return value.lower() in ('true', '1')
+    return bool(value)
+
+
+def _to_str(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+
+# Nel formato binario un campo numerico vuoto (`None`) e'
+# rappresentato da NaN per i float e dal minimo int32 per gli int
+_NULL_INT = -2 ** 31
+
+
+def _pack_int(value):
+    if value is None or value == '':
+        return _NULL_INT
+    return _to_int(value)
+
+
+def _pack_float(value):
+    if value is None or value == '':
+        return float('nan')
+    return float(value)
+
+
+def _unpack_int(value):
+    return None if value == _NULL_INT else value
+
+
+def _unpack_float(value):
+    return None if value != value else value
+
+
+_CONVERTERS = {'i': _pack_int, 'f': _pack_float, 'd': _pack_float}
+_UNPACKERS = {'i': _unpack_int, 'f': _unpack_float, 'd': _unpack_float}
+
+
+def _pack_str(value):
+    return '' if value is None else _to_str(value)
+
+# convertitori applicati in decodifica ai campi con un tipo
+_TYPES = {'int': _to_int, 'float': float, 'double': float,
+          'bool': _to_bool, 'str': _to_str}
+
+
+class Codec:
+    """
+    Codifica e decodifica un tipo di pacchetto, con
+    l'ordine dei campi, il numero di campi e i
+    convertitori calcolati una volta sola dallo schema.
+
+    Il formato testuale e' `{};{};{};{}` seguito, per i
+    tipi protetti, da `nonce` e `digest`.
+    Il formato binario compatto e':
+
+        `tag | bool bitmask | numerici | stringhe | nonce | digest`
+
+    Il tag e' un byte con `BINARY_FLAG`, i flag del trailer
+    e il codice del tipo (0-31); i booleani sono impacchettati
+    a bit, i numerici sono a larghezza fissa e le stringhe
+    sono precedute dalla loro lunghezza (max 255 byte)
+
+    :param tipo: `str`
+        Codice del tipo di pacchetto
+    :param schema: `dict`
+        Campi del pacchetto come definiti in `PROTOCOL`
+    :param protected: `bool`
+        Il tipo puo' avere in coda `nonce` e `digest`
+        DEFAULT: `False`
+    """
+
+    def __init__(self, tipo, schema, protected=False):
+        self.tipo = tipo
+        self.fields = tuple(schema.keys())
+        self.arity = len(self.fields)
+        self.protected = protected
+
+        self._getter = itemgetter(*self.fields)
+
+        try:
+            self.code = int(tipo)
+        except ValueError:
+            self.code = None
+
+        if self.code is not None and not 0 <= self.code <= TYPE_MASK:
+            self.code = None
+
+        self._bools = []
+        self._numbers = []
+        self._strings = []
+
+        # i campi con un tipo vengono convertiti una volta sola
+        # in decodifica, in quelli senza tipo del formato testuale
+        # vengono riconosciuti solo `true`/`false`
+        self._typed = [(key, _TYPES[kind]) for key, kind in schema.items()
+                       if key != 'type' and kind in _TYPES]
+        self._text_bools = [key for key, kind in schema.items()
+                            if key != 'type' and kind == '']
+
+        fmt = ''
+        for key, kind in schema.items():
+            if key == 'type':
+                continue
+            if kind == 'bool':
+                self._bools.append(key)
+            elif kind in _NUMERIC:
+                self._numbers.append((key, _CONVERTERS[_NUMERIC[kind]],
+                                      _UNPACKERS[_NUMERIC[kind]]))
+                fmt += _NUMERIC[kind]
+            else:
+                self._strings.append(key)
+
+        self._mask_size = (len(self._bools) + 7) // 8
+        self._struct = struct.Struct(f'<B{self._mask_size}s{fmt}')
+
+        # campi che possono cambiare tra un keyframe e un delta
+        self._delta_fields = []
+        for key, kind in schema.items():
+            if key in ('dest', 'type'):
+                continue
+            if kind == 'bool':
+                self._delta_fields.append((key, struct.Struct('<?'), _to_bool, None))
+            elif kind in _NUMERIC:
+                self._delta_fields.append((key, struct.Struct('<' + _NUMERIC[kind]),
+                                           _CONVERTERS[_NUMERIC[kind]],
+                                           _UNPACKERS[_NUMERIC[kind]]))
+            else:
+                self._delta_fields.append((key, None, _pack_str, None))
+        self._delta_mask_size = (len(self._delta_fields) + 7) // 8
+
+    # FORMATO TESTUALE
+
+    def _trailer(self, size):
+        extra = size - self.arity
+        if extra == 0 or (self.protected and extra in (1, 2)):
+            return extra
+        raise InvalidFieldsException
+
+    def _add_trailer(self, res, items, extra):
+        try:
+            if extra == 2:
+                res['nonce'] = int(items[-2])
+        except ValueError:
+            raise InvalidFieldsException
+        res['digest'] = items[-1]
+
+    def _convert(self, res):
+        # il primo byte di un pacchetto testuale non deve
+        # poter essere scambiato per il tag binario
+        dest = res.get('dest')
+        if isinstance(dest, str) and dest and ord(dest[0]) >= BINARY_FLAG:
+            raise InvalidFieldsException('dest must start with an ascii character')
+
+        for key, conv in self._typed:
+            value = res[key]
+            try:
+                res[key] = conv(value)
+            except (ValueError, TypeError):
+                # un campo vuoto e' un valore mancante
+                if value != '' and value is not None:
+                    raise InvalidFieldsException
+                res[key] = None
+
+    def from_text(self, items):
+        """Decodifica i campi di una stringa gia' divisa su `;`"""
+        extra = self._trailer(len(items))
+        res = dict(zip(self.fields, items))
+        self._convert(res)
+        for key in self._text_bools:
+            item = res[key]
+            res[key] = _TEXT_BOOL.get(item.lower(), item)
+        if extra:
+            self._add_trailer(res, items, extra)
+        return res
+
+    def from_sequence(self, items):
+        extra = self._trailer(len(items))
+        res = dict(zip(self.fields, items))
+        self._convert(res)
+        if extra:
+            self._add_trailer(res, items, extra)
+        return res
+
+    def from_dict(self, data):
+        try:
+            values = self._getter(data)
+        except KeyError:
+            raise InvalidFieldsException
+
+        res = dict(zip(self.fields, values)) if self.arity > 1 else {self.fields[0]: values}
+        self._convert(res)
+        extra = self._trailer(len(data))
+        if extra:
+            for key in ('nonce', 'digest'):
+                if key in data:
+                    res[key] = data[key]
+            if len(res) != len(data):
+                raise InvalidFieldsException
+        return res
+
+    # FORMATO BINARIO
+
+    def _pack(self, content, tag, length):
+        mask = 0
+        bit = 1
+        for key in self._bools:
+            value = content[key]
+            if value is True or (value is not False and _to_bool(value)):
+                mask |= bit
+            bit <<= 1
+
+        try:
+            numbers = [conv(content[key]) for key, conv, _ in self._numbers]
+            res = [self._struct.pack(tag, mask.to_bytes(self._mask_size, 'little'),
+                                     *numbers)]
+
+            for key in self._strings:
+                raw = _pack_str(content[key]).encode('utf-8')
+                res.append(length.pack(len(raw)))
+                res.append(raw)
+
+            if tag & NONCE_FLAG:
+                res.append(_NONCE.pack(int(content['nonce'])))
+        except (ValueError, TypeError, struct.error):
+            raise InvalidFieldsException
+
+        return res
+
+    def to_binary(self, content):
+        if self.code is None:
+            raise InvalidTypeException
+
+        tag = BINARY_FLAG | self.code
+        if 'nonce' in content:
+            tag |= NONCE_FLAG
+        if 'digest' in content:
+            tag |= DIGEST_FLAG
+
+        res = self._pack(content, tag, _LEN)
+        if tag & DIGEST_FLAG:
+            res.append(bytes.fromhex(content['digest']))
+
+        return b''.join(res)
+
+    def canonical(self, content):
+        """Serializzazione canonica usata come input del digest:
+        il corpo binario del pacchetto senza il digest, con le
+        stringhe lunghe fino a 64KiB. Non dipende dal formato
+        (testo o binario) con cui il pacchetto e' viaggiato
+        """
+        tag = (self.code or 0) | (NONCE_FLAG if 'nonce' in content else 0)
+        return b''.join(self._pack(content, tag, _LONG_LEN))
+
+    def peek_binary(self, data):
+        """Legge solo il campo `dest`, se e' la prima stringa"""
+        if not self._strings or self._strings[0] != 'dest':
+            return None
+        try:
+            offset = self._struct.size
+            size = data[offset]
+            return bytes(data[offset+1:offset+1+size]).decode('utf-8')
+        except (IndexError, UnicodeDecodeError):
+            raise InvalidFieldsException
+
+    def from_binary(self, data):
+        try:
+            tag, mask, *numbers = self._struct.unpack_from(data)
+            offset = self._struct.size
+
+            strings = dict()
+            for key in self._strings:
+                size = data[offset]
+                offset += 1
+                strings[key] = bytes(data[offset:offset+size]).decode('utf-8')
+                offset += size
+
+            if tag & NONCE_FLAG:
+                nonce, = _NONCE.unpack_from(data, offset)
+                offset += _NONCE.size
+            if tag & DIGEST_FLAG:
+                digest = bytes(data[offset:offset+DIGEST_SIZE]).hex()
+                offset += DIGEST_SIZE
+        except (IndexError, UnicodeDecodeError, struct.error):
+            raise InvalidFieldsException
+
+        if offset != len(data):
+            raise InvalidFieldsException
+
+        mask = int.from_bytes(mask, 'little')
+        values = strings
+        values.update({key: bool(mask >> i & 1) for i, key in enumerate(self._bools)})
+        values.update({key: unpack(val) for (key, _, unpack), val in zip(self._numbers, numbers)})
+        values['type'] = self.tipo
+
+        res = {key: values[key] for key in self.fields}
+        if tag & NONCE_FLAG:
+            res['nonce'] = nonce
+        if tag & DIGEST_FLAG:
+            res['digest'] = digest
+
+        return res
+
+
+    # FORMATO DELTA
+
+    def to_keyframe(self, content, seq):
+        if self.code is None:
+            raise InvalidTypeException
+        return _DELTA.pack(DELTA, KEYFRAME_FLAG | self.code, seq) + self.to_binary(content)
+
+    def to_delta(self, content, seq, reference):
+        """Codifica solo i campi di `content` diversi
+        da quelli del keyframe `reference`
+        """
+        if self.code is None:
+            raise InvalidTypeException
+
+        dest = _to_str(content['dest']).encode('utf-8')
+        mask = 0
+        res = []
+        try:
+            for i, (key, coder, conv, _) in enumerate(self._delta_fields):
+                value = content[key]
+                if value == reference.get(key):
+                    continue
+                mask |= 1 << i
+                if coder:
+                    res.append(coder.pack(conv(value)))
+                else:
+                    raw = conv(value).encode('utf-8')
+                    res.append(_LEN.pack(len(raw)))
+                    res.append(raw)
+
+            head = [_DELTA.pack(DELTA, self.code, seq), _LEN.pack(len(dest)), dest,
+                    mask.to_bytes(self._delta_mask_size, 'little')]
+        except (ValueError, TypeError, struct.error, OverflowError):
+            raise InvalidFieldsException
+
+        return b''.join(head + res)
+
+    def from_delta(self, data):
+        """Ritorna `(seq, keyframe, contenuto)`, per un delta
+        il contenuto ha solo `dest`, `type` e i campi cambiati
+        """
+        try:
+            _, flag, seq = _DELTA.unpack_from(data)
+            offset = _DELTA.size
+            if flag & KEYFRAME_FLAG:
+                return seq, True, self.from_binary(data[offset:])
+
+            size = data[offset]
+            res = {'dest': bytes(data[offset+1:offset+1+size]).decode('utf-8'),
+                   'type': self.tipo}
+            offset += 1 + size
+
+            mask = int.from_bytes(data[offset:offset+self._delta_mask_size], 'little')
+            offset += self._delta_mask_size
+
+            for i, (key, coder, _, unpack) in enumerate(self._delta_fields):
+                if not mask >> i & 1:
+                    continue
+                if coder:
+                    value, = coder.unpack_from(data, offset)
+                    res[key] = unpack(value) if unpack else value
+                    offset += coder.size
+                else:
+                    size = data[offset]
+                    res[key] = bytes(data[offset+1:offset+1+size]).decode('utf-8')
+                    offset += 1 + size
+        except (IndexError, UnicodeDecodeError, struct.error):
+            raise InvalidFieldsException
+
+        if offset != len(data):
+            raise InvalidFieldsException
+
+        return seq, False, res
+
+
+def compile_protocol(protocol, protected=()):
+    """Compila un codec per ogni tipo del protocollo.
+    Ritorna due dizionari: `tipo -> codec` e, per i tipi
+    con un codice numerico valido (0-31), `codice -> codec`
+    """
+    codecs = {tipo: Codec(tipo, schema, tipo in protected)
+              for tipo, schema in protocol.items()}
+    binary = {codec.code: codec for codec in codecs.values()
+              if codec.code is not None}
+
+    return codecs, binary
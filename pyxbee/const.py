@@ -1,80 +1,122 @@
 PORT = '/dev/ttyUSB0'
 BAUD_RATE = 115200
 
+# payload massimo di un frame xbee (byte)
+MAX_PAYLOAD = 100
+# attesa massima prima di inviare un frame aggregato (s)
+FLUSH_INTERVAL = 0.005
+# numero massimo di delta DATA tra due keyframe
+KEYFRAME_INTERVAL = 50
+# attesa minima prima di ritentare un keyframe non confermato (s)
+KEYFRAME_RETRY = 1.0
+# tempo massimo per ricevere tutti i frammenti di un pacchetto (s)
+FRAGMENT_TIMEOUT = 2.0
+# pacchetti frammentati in ricostruzione contemporaneamente
+REASSEMBLY_BUFFERS = 16
+# pacchetti ricevuti in attesa dei worker
+RECEIVE_QUEUE = 256
+
+# invio affidabile: frame in volo, tentativi dopo il primo,
+# attesa del transmit status (s) e del primo nuovo tentativo (s)
+RELIABLE_WINDOW = 8
+RELIABLE_RETRIES = 3
+RELIABLE_TIMEOUT = 2.0
+RELIABLE_BACKOFF = 0.05
+
+# priorita' di invio per tipo, zero e' la piu' alta:
+# prima i tipi protetti (comandi), poi NOTICE e STATE,
+# per ultima la telemetria
+SEND_PRIORITY = {
+    '3': 0,     # SETTING
+    '4': 0,     # SIGNAL
+    '5': 0,     # MESSAGE
+    '6': 0,     # RASPBERRY
+    '7': 0,     # VIDEO
+    '2': 1,     # NOTICE
+    '1': 1,     # STATE
+    '0': 2      # DATA
+}
+
+# Il valore di ogni campo ne dichiara il tipo: 'int', 'float',
+# 'double', 'bool' oppure 'str'. Nel formato binario 'float' e'
+# a 32 bit, 'double' a 64 bit: i valori 'double' tornano identici
+# a quelli del formato testuale. I valori vengono convertiti
+# una volta sola in decodifica; un campo senza tipo ('')
+# resta una stringa (o un booleano se vale `true`/`false`)
 PROTOCOL = {
     # DATA
     '0': {
         'dest': '',
         'type': '0',
-        'heartrate': '',
-        'power': '',
-        'cadence': '',
-        'distance': '',
-        'speed': '',
-        'time': '',
-        'gear': ''
+        'heartrate': 'double',
+        'power': 'double',
+        'cadence': 'double',
+        'distance': 'double',
+        'speed': 'double',
+        'time': 'double',
+        'gear': 'double'
     },
     # STATE
     '1': {
         'dest': '',
         'type': '1',
-        'log': '',
-        'video': '',
-        'ant': '',
-        'video_running': '',
-        'video_recording': '',
-        'powermeter_running': '',
-        'heartrate_running': '',
-        'speed_running': '',
-        'calibration': ''
+        'log': 'bool',
+        'video': 'bool',
+        'ant': 'bool',
+        'video_running': 'bool',
+        'video_recording': 'bool',
+        'powermeter_running': 'bool',
+        'heartrate_running': 'bool',
+        'speed_running': 'bool',
+        'calibration': 'bool'
     },
     # NOTICE
     '2': {
         'dest': '',
         'type': '2',
-        'valore': ''
+        'valore': 'int'
     },
     # SETTINGS
     '3': {
         'dest': '',
         'type': '3',
-        'circonferenza': '',
-        'run': '',
-        'log': '',
-        'csv': '',
-        'ant': '',
-        'potenza': '',
-        'led': '',
-        'calibration_value': '',
-        'update': '',
-        'p13': ''
+        'circonferenza': 'double',
+        'run': 'double',
+        'log': 'bool',
+        'csv': 'bool',
+        'ant': 'bool',
+        'potenza': 'double',
+        'led': 'double',
+        'calibration_value': 'double',
+        'update': 'double',
+        'p13': 'bool'
     },
     # SIGNAL
     '4': {
         'dest': '',
         'type': '4',
-        'valore': ''
+        'valore': 'int'
     },
     # MESSAGE
     '5': {
         'dest': '',
         'type': '5',
-        'messaggio': '',
-        'priorita': '',
-        'durata': '',
-        'timeout': ''
+        'messaggio': 'str',
+        'priorita': 'int',
+        'durata': 'double',
+        'timeout': 'double'
     },
     # RASPBERRY
     '6': {
         'dest': '',
         'type': '6',
-        'valore': ''
+        'valore': 'int'
     },
     # VIDEO
     '7': {
         'dest': '',
         'type': '7',
-        'value': '',
-        'name_file': ''
+        'value': 'bool',
+        'name_file': 'str'
     }
 }
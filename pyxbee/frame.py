@@ -0,0 +1,261 @@
+import logging
+import struct
+import threading
+import time
+
+from collections import OrderedDict
+
+from .const import MAX_PAYLOAD, FLUSH_INTERVAL, FRAGMENT_TIMEOUT, REASSEMBLY_BUFFERS
+from .exception import InvalidFieldsException
+
+log = logging.getLogger(__name__)
+
+# Marcatore dei frame che contengono piu' pacchetti:
+# non e' un carattere stampabile e non ha il bit alto,
+# quindi non si confonde ne' col formato testuale ne'
+# con quello binario
+AGGREGATE = 0x1D
+
+# Marcatore dei frammenti di un pacchetto troppo grande
+# per un frame: `FRAGMENT | id | indice | totale | dati`
+FRAGMENT = 0x1E
+_FRAGMENT = struct.Struct('<BBBB')
+
+
+def is_aggregate(frame):
+    return len(frame) > 0 and frame[0] == AGGREGATE
+
+
+def aggregate(payloads):
+    """Unisce piu' pacchetti in un frame:
+    `AGGREGATE | len | pacchetto | len | pacchetto ...`
+    Un solo pacchetto viene lasciato com'e'
+    """
+    if len(payloads) == 1:
+        return payloads[0]
+
+    res = [bytes([AGGREGATE])]
+    for payload in payloads:
+        if len(payload) > 0xFF:
+            raise InvalidFieldsException
+        res.append(bytes([len(payload)]))
+        res.append(payload)
+    return b''.join(res)
+
+
+def split(frame):
+    """Divide un frame aggregato nei pacchetti che contiene"""
+    if not is_aggregate(frame):
+        return [frame]
+
+    res = []
+    offset = 1
+    while offset < len(frame):
+        size = frame[offset]
+        offset += 1
+        if size == 0 or offset + size > len(frame):
+            raise InvalidFieldsException
+        res.append(bytes(frame[offset:offset+size]))
+        offset += size
+    return res
+
+
+def is_fragment(frame):
+    return len(frame) > 0 and frame[0] == FRAGMENT
+
+
+def fragment(data, max_payload, msg_id):
+    """Divide `data` in frammenti che stanno in `max_payload`"""
+    size = max_payload - _FRAGMENT.size
+    if size <= 0:
+        raise InvalidFieldsException
+
+    chunks = [data[i:i+size] for i in range(0, len(data), size)]
+    if len(chunks) > 0xFF:
+        raise InvalidFieldsException
+
+    return [_FRAGMENT.pack(FRAGMENT, msg_id & 0xFF, i, len(chunks)) + chunk
+            for i, chunk in enumerate(chunks)]
+
+
+class Reassembler:
+    """
+    Ricostruisce i pacchetti frammentati.
+    I buffer sono limitati: un pacchetto non completato
+    entro `timeout` secondi viene scartato e, se ci sono
+    gia' `max_buffers` pacchetti in ricostruzione, il piu'
+    vecchio viene eliminato
+
+    :param timeout: `float`
+        DEFAULT: `2.0`
+    :param max_buffers: `int`
+        DEFAULT: `16`
+    """
+
+    def __init__(self, timeout=FRAGMENT_TIMEOUT, max_buffers=REASSEMBLY_BUFFERS):
+        self._timeout = timeout
+        self._max_buffers = max_buffers
+
+        # (sorgente, id) -> [scadenza, totale, frammenti]
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def feed(self, source, frame):
+        """Aggiunge un frammento, ritorna il pacchetto
+        completo quando arriva l'ultimo, altrimenti `None`
+        """
+        if len(frame) < _FRAGMENT.size:
+            raise InvalidFieldsException
+
+        _, msg_id, index, count = _FRAGMENT.unpack_from(frame)
+        if index >= count:
+            raise InvalidFieldsException
+
+        now = time.monotonic()
+        key = (source, msg_id)
+
+        with self._lock:
+            self._expire(now)
+
+            buf = self._buffers.get(key)
+            if buf is None or buf[1] != count:
+                # un id riusato con un altro totale e' un nuovo pacchetto
+                self._buffers.pop(key, None)
+                if len(self._buffers) >= self._max_buffers:
+                    self._buffers.popitem(last=False)
+                    self.evicted += 1
+                buf = [now + self._timeout, count, dict()]
+                self._buffers[key] = buf
+
+            buf[2][index] = bytes(frame[_FRAGMENT.size:])
+            if len(buf[2]) < count:
+                return None
+
+            del self._buffers[key]
+
+        return b''.join(buf[2][i] for i in range(count))
+
+    def _expire(self, now):
+        while self._buffers:
+            key, buf = next(iter(self._buffers.items()))
+            if buf[0] > now:
+                break
+            del self._buffers[key]
+            self.expired += 1
+
+
+class Aggregator:
+    """
+    Accoda i pacchetti diretti allo stesso indirizzo
+    e li invia in un unico frame, appena il frame e' pieno
+    o al piu' dopo `flush_interval` secondi dal primo
+    pacchetto accodato
+
+    :param send: `callable`
+        Funzione `send(address, frame)` che invia il frame
+    :param max_payload: `int`
+        Dimensione massima di un frame
+        DEFAULT: `100`
+    :param flush_interval: `float`
+        DEFAULT: `0.005`
+    """
+
+    def __init__(self, send, max_payload=MAX_PAYLOAD, flush_interval=FLUSH_INTERVAL):
+        self._send = send
+        self._max_payload = max_payload
+        self._flush_interval = flush_interval
+
+        # indirizzo -> [scadenza, dimensione, pacchetti]
+        self._queues = dict()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def max_payload(self):
+        return self._max_payload
+
+    @property
+    def flush_interval(self):
+        return self._flush_interval
+
+    def put(self, address, payload):
+        ready = None
+        size = len(payload) + 1
+
+        with self._cond:
+            # un pacchetto che non sta in un frame aggregato parte da solo
+            alone = size + 1 > self._max_payload or self._closed
+
+            queue = self._queues.get(address)
+            if queue and (alone or queue[1] + size > self._max_payload):
+                ready = self._queues.pop(address)[2]
+                queue = None
+
+            if not alone:
+                if queue is None:
+                    queue = [time.monotonic() + self._flush_interval, 1, []]
+                    self._queues[address] = queue
+                    self._cond.notify()
+                queue[1] += size
+                queue[2].append(payload)
+
+        if ready:
+            self._send(address, aggregate(ready))
+        if alone:
+            self._send(address, payload)
+
+    def flush(self, address=None):
+        """Invia subito i pacchetti accodati per `address`,
+        o per tutti gli indirizzi
+        """
+        with self._cond:
+            if address is None:
+                ready = list(self._queues.items())
+                self._queues.clear()
+            elif address in self._queues:
+                ready = [(address, self._queues.pop(address))]
+            else:
+                ready = []
+
+        for addr, queue in ready:
+            self._send(addr, aggregate(queue[2]))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queues and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+
+                now = time.monotonic()
+                deadline = min(queue[0] for queue in self._queues.values())
+                if deadline > now:
+                    self._cond.wait(deadline - now)
+                    continue
+
+                ready = [(addr, queue[2]) for addr, queue in self._queues.items()
+                         if queue[0] <= now]
+                for addr, _ in ready:
+                    del self._queues[addr]
+
+            for addr, payloads in ready:
+                try:
+                    self._send(addr, aggregate(payloads))
+                except Exception:
+                    log.exception(f'({addr}) aggregated frame not sent')
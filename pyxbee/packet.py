@@ -1,25 +1,44 @@
+import hmac
 import json
 import logging
+import random
+import threading
+import time
 
 from abc import ABC
 from hashlib import blake2s
 
-from .const import PROTOCOL
+from .codec import TYPE_MASK, compile_protocol, is_binary, is_delta
+from .const import PROTOCOL, KEYFRAME_RETRY
 from .exception import InvalidTypeException, InvalidFieldsException, InvalidInstanceException
 
 log = logging.getLogger(__name__)
 
 NOUCE_COUNTER = 0
 
+# hasher blake2s gia' inizializzati con la chiave,
+# per ogni digest ne viene clonato uno con `.copy()`
+_HASHERS = dict()
+
+
+def _hasher(key):
+    h = _HASHERS.get(key)
+    if h is None:
+        raw = key.encode('utf-8') if isinstance(key, str) else key
+        h = _HASHERS[key] = blake2s(key=raw, digest_size=16)
+    return h.copy()
+
 
 class _ABCPacket(ABC):
     """
     Classe genitore per operazioni di basso livello
     sui pacchetti
 
-    :param content: `tuple` or `dict` or `str`
+    :param content: `tuple` or `dict` or `str` or `bytes`
         Contenuto del pacchetto che viene opportunamente
         filtrato e e trasformato in dizionario.
+        I `bytes` possono essere sia in formato testuale
+        che binario, riconosciuto automaticamente.
         DEFAULT: `None`
     :param nonce: `bool`
         Abilita o disabilita l'aggiunta di un nonce nei
@@ -27,13 +46,21 @@ class _ABCPacket(ABC):
         Utile settarlo a `False` solo nei test, per provare
         la corretta generazione del digest
         DEFAULT: `True`
+    :param lazy: `bool`
+        Se il contenuto e' una stringa o dei bytes ne
+        legge subito solo `dest` e `type`; il resto viene
+        decodificato al primo accesso al contenuto.
+        Gli errori sui campi vengono quindi sollevati
+        solo in quel momento
+        DEFAULT: `False`
     """
 
-    _PACKETS = dict(PROTOCOL)
-
     # chiave per il digest
     _SECRET_KEY = None
 
+    # accetta anche i digest nel vecchio formato (json)
+    legacy_digest = False
+
     # tipi pacchetto per il protocollo standard
     class Type:
         DATA = '0'
@@ -45,29 +72,68 @@ class _ABCPacket(ABC):
         RASPBERRY = '6'
         VIDEO = '7'
 
-    def __init__(self, content=None, nonce=True):
+    _PROTECTED = (Type.SETTING,
+                  Type.SIGNAL,
+                  Type.MESSAGE,
+                  Type.RASPBERRY,
+                  Type.VIDEO)
+
+    # codec precompilati per ogni tipo del protocollo attivo
+    _PACKETS = dict(PROTOCOL)
+    _CODECS, _BINARY = compile_protocol(_PACKETS, _PROTECTED)
+
+    def __init__(self, content=None, nonce=True, lazy=False):
         self._nonce = nonce
+        self._raw = None
+        self._header = None
+        self._json = None
+
+        # solo per keyframe e delta
+        self._seq = None
+        self._keyframe = False
 
         if content is None:
             self._content = dict()
+        elif lazy and isinstance(content, (str, bytes, bytearray)):
+            self._header = self._peek(content)
+            if self._header:
+                self._raw = bytes(content) if isinstance(content, bytearray) else content
+                self._content = None
+            else:
+                self._content = self._decode(content)
         else:
             self._content = self._decode(content)
 
     @property
     def content(self):
-        return tuple(self._content.values())
+        return tuple(self.content_dict.values())
 
     @property
     def content_dict(self):
+        if self._content is None:
+            self._content = self._decode(self._raw)
+            self._raw = None
         return self._content
 
+    @property
+    def decoded(self):
+        """`False` finche' un pacchetto lazy non viene decodificato"""
+        return self._content is not None
+
+    @property
+    def valid(self):
+        """Decodifica il pacchetto se serve, `False` se
+        il contenuto non e' valido
+        """
+        try:
+            self.content_dict
+        except (InvalidTypeException, InvalidFieldsException):
+            return False
+        return True
+
     @property
     def protected_type(self):
-        return (Packet.Type.SETTING,
-                Packet.Type.SIGNAL,
-                Packet.Type.MESSAGE,
-                Packet.Type.RASPBERRY,
-                Packet.Type.VIDEO)
+        return self._PROTECTED
 
     @property
     def secret_key(self):
@@ -85,6 +151,7 @@ class _ABCPacket(ABC):
         """Permette l'inserimento di un protocollo
         custom, se non viene passato un nuovo 
         protocollo, ripristina quello di default.
+        Il protocollo viene compilato nei codec per tipo.
         Ritorna il nuovo protocollo
 
         :param protocol: `dict` or `str`
@@ -97,68 +164,110 @@ class _ABCPacket(ABC):
         else:
             cls._PACKETS = dict(PROTOCOL)
 
+        cls._CODECS, cls._BINARY = compile_protocol(cls._PACKETS, cls._PROTECTED)
         return cls._PACKETS
 
     @classmethod
     def calculate_digest(cls, data):
-        h = blake2s(key=cls.secret_key, digest_size=16)
+        """Digest nel vecchio formato, calcolato sul json
+        del dizionario. Mantenuto per compatibilita'
+        """
+        h = _hasher(cls.secret_key)
         h.update(json.dumps(data).encode('utf-8'))
 
         return h.hexdigest()
 
+    def _mac(self, dic):
+        h = _hasher(self.secret_key)
+        h.update(self._codec(dic['type']).canonical(dic))
+
+        return h.hexdigest()
+
     def _decode(self, data):
-        """Se viene passato un dizionario aggiorna
-        i valori da un pacchetto corrispondente vuoto;
+        """Se viene passato un dizionario ne estrae i valori
+        nell'ordine del protocollo;
         se viene passata una lista/tupla/stringa
         ne estrae i valori e li converte in dizionario.
         """
-        self._check_data(data)
+        if isinstance(data, (bytes, bytearray)):
+            if is_binary(data):
+                return self._binary_codec(data[0] & TYPE_MASK).from_binary(data)
+            if is_delta(data):
+                if len(data) < 2:
+                    raise InvalidFieldsException
+                codec = self._binary_codec(data[1] & TYPE_MASK)
+                self._seq, self._keyframe, dic = codec.from_delta(data)
+                return dic
+            data = data.decode('utf-8')
+
+        if isinstance(data, str):
+            # ORDINE VALORI IMPORTANTE
+            # stringhe e bytes sono pacchetti ricevuti, non vengono firmati
+            items = data.split(';')
+            return self._codec(items[1] if len(items) > 1 else None).from_text(items)
 
         if isinstance(data, dict):
             # ORDINE VALORI NON IMPORTANTE
-            dic = dict(self._PACKETS[str(data['type'])])
-            dic.update(data)
+            dic = self._codec(data.get('type')).from_dict(data)
         else:
-            # ORDINE VALORI IMPORTANTE
-            dic = self._dictify(data)
+            dic = self._codec(data[1] if len(data) > 1 else None).from_sequence(data)
 
-        if dic['type'] in self.protected_type and self.secret_key:
+        if dic['type'] in self._PROTECTED and self.secret_key and 'digest' not in dic:
             self._add_digest(dic)
 
-        return dict(dic)
+        return dic
 
-    def _check_data(self, data):
-        if isinstance(data, dict):
-            content = data.values()
-            tipo = data['type']
-        else:
-            content = data if isinstance(data, (list, tuple)) else data.split(';')
-            tipo = content[1]
+    @classmethod
+    def peek_type(cls, data):
+        """Tipo di un pacchetto ricevuto letto dalla sola
+        intestazione, `None` se non e' riconoscibile
+        """
+        try:
+            if is_binary(data):
+                return cls._BINARY[data[0] & TYPE_MASK].tipo
+            if is_delta(data):
+                return cls._BINARY[data[1] & TYPE_MASK].tipo
+            if isinstance(data, str):
+                return data.split(';', 2)[1]
+            return bytes(data).split(b';', 2)[1].decode('utf-8')
+        except (KeyError, IndexError, TypeError, UnicodeDecodeError):
+            return None
+
+    def _peek(self, data):
+        """Legge solo `dest` e `type` del pacchetto, ritorna
+        `None` se l'intestazione non basta a riconoscerlo
+        """
+        if is_delta(data):
+            return None
 
-        # check valid type
-        if tipo not in self._PACKETS.keys():
-            raise InvalidTypeException
+        if is_binary(data):
+            codec = self._binary_codec(data[0] & TYPE_MASK)
+            dest = codec.peek_binary(data)
+            return (dest, codec.tipo) if dest is not None else None
 
-        # check valid len
-        if len(content) != len(self._PACKETS[tipo].values()):
-            raise InvalidFieldsException
+        if isinstance(data, (bytes, bytearray)):
+            data = bytes(data).decode('utf-8')
 
-    def _dictify(self, data):
-        if isinstance(data, str):
-            data = [json.loads(item.lower()) if item.lower() in ('true', 'false')
-                    else item for item in data.split(';')]
+        header = data.split(';', 2)
+        self._codec(header[1] if len(header) > 1 else None)
+        return (header[0], header[1]) if len(header) > 2 else None
 
-        content = list(data[::-1])
-        res = dict(self._PACKETS[str(data[1])])
-        for key, _ in res.items():
-            res[key] = content.pop()
+    def _codec(self, tipo):
+        codec = self._CODECS.get(tipo)
+        if codec is None:
+            raise InvalidTypeException
+        return codec
 
-        return res
+    def _binary_codec(self, code):
+        codec = self._BINARY.get(code)
+        if codec is None:
+            raise InvalidTypeException
+        return codec
 
     def _add_digest(self, dic):
         if self._nonce:
             dic.update({'nonce': self._inc_nonce()})
-        dic.update({'digest': self.calculate_digest(dic)})
+        dic.update({'digest': self._mac(dic)})
 
     @staticmethod
     def _inc_nonce():
@@ -167,10 +276,10 @@ class _ABCPacket(ABC):
         return NOUCE_COUNTER
 
     def __len__(self):
-        return len(self._content)
+        return len(self.content_dict)
 
     def __str__(self):
-        return str(self._content)
+        return str(self.content_dict)
 
 
 class Packet(_ABCPacket):
@@ -186,19 +295,41 @@ class Packet(_ABCPacket):
 
     @property
     def dest(self):
+        if not self.decoded:
+            return self._header[0]
         return self.content_dict['dest'] if len(self) > 0 else None
 
     @property
     def tipo(self):
+        if not self.decoded:
+            return self._header[1]
         return self.content_dict['type'] if len(self) > 0 else None
 
+    @property
+    def seq(self):
+        """Sequenza del keyframe di riferimento, `None`
+        se il pacchetto non e' un keyframe o un delta
+        """
+        return self._seq
+
+    @property
+    def keyframe(self):
+        return self._keyframe
+
     @property
     def value(self):
         return self.content[2:]
 
     @property
     def encode(self):
-        return ';'.join(map(str, self.content))
+        # un campo vuoto resta vuoto
+        return ';'.join('' if value is None else str(value)
+                        for value in self.content_dict.values())
+
+    @property
+    def encode_binary(self):
+        """Codifica il pacchetto nel formato binario compatto"""
+        return self._codec(self.tipo).to_binary(self.content_dict)
 
     @property
     def digest(self):
@@ -209,8 +340,13 @@ class Packet(_ABCPacket):
         return self.content_dict.get('nonce')
 
     @property
-    def raw_data(self):
+    def canonical(self):
         """Usata per il calcolo del digest"""
+        return self._codec(self.tipo).canonical(self.content_dict)
+
+    @property
+    def raw_data(self):
+        """Usata per il calcolo del digest nel vecchio formato"""
 
         if 'digest' in self.content_dict.keys():
             data = dict(self.content_dict)
@@ -219,10 +355,122 @@ class Packet(_ABCPacket):
             data = self.content_dict
         return data
 
+    def verify(self):
+        """Controlla che il digest corrisponda al contenuto del
+        pacchetto. Con `legacy_digest` viene accettato anche
+        un digest nel vecchio formato
+        """
+        content = self.content_dict
+        digest = content.get('digest')
+        if not digest or not self.secret_key:
+            return False
+
+        digest = str(digest).encode('utf-8')
+        h = _hasher(self.secret_key)
+        h.update(self._CODECS[content['type']].canonical(content))
+        if hmac.compare_digest(digest, h.hexdigest().encode('utf-8')):
+            return True
+
+        return self.legacy_digest and hmac.compare_digest(
+            digest, self.calculate_digest(self.raw_data).encode('utf-8'))
+
+    def encode_keyframe(self, seq):
+        """Codifica il pacchetto come keyframe `seq`"""
+        return self._codec(self.tipo).to_keyframe(self.content_dict, seq)
+
+    def encode_delta(self, seq, reference):
+        """Codifica solo i campi diversi dal contenuto
+        `reference` del keyframe `seq`
+        """
+        return self._codec(self.tipo).to_delta(self.content_dict, seq, reference)
+
     @property
     def jsonify(self):
-        return json.dumps(self.content_dict)
+        """Il contenuto di un pacchetto non cambia,
+        quindi viene serializzato una volta sola
+        """
+        if self._json is None:
+            self._json = json.dumps(self.content_dict)
+        return self._json
 
     @property
     def dictify(self):
         return self.content_dict
+
+
+class DeltaEncoder:
+    """
+    Codifica i pacchetti verso una destinazione come delta
+    rispetto all'ultimo keyframe confermato.
+    Se non c'e' un keyframe confermato o ne sono gia' stati
+    mandati `keyframe_interval` delta, produce un nuovo
+    keyframe, che diventa il riferimento solo dopo `ack`.
+
+    Un solo keyframe alla volta e' in attesa di conferma e,
+    se fallisce, il successivo parte dopo `keyframe_retry`
+    secondi dal fallimento; nel frattempo i pacchetti sono delta rispetto
+    al keyframe confermato precedente o, se non c'e',
+    pacchetti binari completi
+
+    :param keyframe_interval: `int`
+        Numero massimo di delta tra due keyframe
+    :param keyframe_retry: `float`
+        Attesa dopo un keyframe non confermato (s)
+        DEFAULT: `1.0`
+    """
+
+    def __init__(self, keyframe_interval, keyframe_retry=KEYFRAME_RETRY):
+        self._interval = keyframe_interval
+        self._retry = keyframe_retry
+        # una sequenza iniziale casuale evita che, dopo un riavvio,
+        # i delta vengano applicati a un keyframe della sessione prima
+        self._seq = random.randrange(0x10000)
+        self._count = 0
+        self._acked = None
+        self._pending = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def reference(self):
+        """`(seq, contenuto)` dell'ultimo keyframe confermato"""
+        return self._acked
+
+    @property
+    def pending(self):
+        """Sequenza del keyframe in attesa di conferma"""
+        return self._pending[0] if self._pending else None
+
+    def encode(self, packet, now=None):
+        """Ritorna `(seq, keyframe, frame)`, `seq` e' `None`
+        per un pacchetto binario completo
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if (self._acked is None or self._count >= self._interval) \
+                    and self._pending is None and now >= self._retry_at:
+                self._seq = (self._seq + 1) & 0xFFFF
+                self._pending = (self._seq, dict(packet.content_dict))
+                return self._seq, True, packet.encode_keyframe(self._seq)
+
+            if self._acked is None:
+                return None, False, packet.encode_binary
+
+            self._count += 1
+            seq, reference = self._acked
+        return seq, False, packet.encode_delta(seq, reference)
+
+    def ack(self, seq):
+        with self._lock:
+            if self._pending and self._pending[0] == seq:
+                self._acked = self._pending
+                self._pending = None
+                self._count = 0
+
+    def fail(self, seq, now=None):
+        """Il keyframe `seq` non e' stato confermato"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._pending and self._pending[0] == seq:
+                self._pending = None
+                self._retry_at = now + self._retry
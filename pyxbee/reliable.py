@@ -0,0 +1,245 @@
+import logging
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import Future
+
+from .const import RELIABLE_WINDOW, RELIABLE_RETRIES, RELIABLE_TIMEOUT, RELIABLE_BACKOFF
+
+log = logging.getLogger(__name__)
+
+
+def gather(futures):
+    """Future che vale `True` quando tutti i `futures`
+    valgono `True`, `False` appena uno vale `False`
+    """
+    res = Future()
+    futures = list(futures)
+    left = [len(futures)]
+    lock = threading.Lock()
+
+    def done(future):
+        with lock:
+            if res.done():
+                return
+            if not future.result():
+                res.set_result(False)
+                return
+            left[0] -= 1
+            if not left[0]:
+                res.set_result(True)
+
+    if not futures:
+        res.set_result(True)
+    for future in futures:
+        future.add_done_callback(done)
+    return res
+
+
+class _Entry:
+    __slots__ = ('address', 'data', 'future', 'attempts', 'deadline')
+
+    def __init__(self, address, data, future):
+        self.address = address
+        self.data = data
+        self.future = future
+        self.attempts = 0
+        # scadenza dell'ack o, in attesa di un nuovo
+        # tentativo, istante da cui puo' ripartire
+        self.deadline = 0.0
+
+
+class ReliableSender:
+    """
+    Invio affidabile a finestra scorrevole: fino a `window`
+    frame sono in volo contemporaneamente, ognuno identificato
+    dal frame ID dell'antenna e confermato dal suo transmit
+    status. Un frame fallito o senza risposta entro `timeout`
+    viene ritrasmesso da solo, con attesa esponenziale, fino
+    a `retries` volte.
+
+    Ogni invio ritorna un `Future` che vale `True` se il frame
+    e' stato consegnato, `False` se sono finiti i tentativi
+
+    :param transmit: `callable`
+        Funzione `transmit(address, data)` che invia il frame
+        senza aspettare e ne ritorna il frame ID
+    :param window: `int`
+        Frame in volo contemporaneamente
+        DEFAULT: `8`
+    :param retries: `int`
+        Tentativi dopo il primo invio
+        DEFAULT: `3`
+    :param timeout: `float`
+        Attesa massima del transmit status (s)
+        DEFAULT: `2.0`
+    :param backoff: `float`
+        Attesa prima del primo nuovo tentativo, raddoppiata
+        ad ogni tentativo successivo (s)
+        DEFAULT: `0.05`
+    """
+
+    def __init__(self, transmit, window=RELIABLE_WINDOW, retries=RELIABLE_RETRIES,
+                 timeout=RELIABLE_TIMEOUT, backoff=RELIABLE_BACKOFF):
+        if window < 1:
+            raise ValueError('window must be positive')
+
+        self._transmit = transmit
+        self._window = window
+        self._retries = retries
+        self._timeout = timeout
+        self._backoff = backoff
+
+        # frame ID -> elemento in volo
+        self._inflight = dict()
+        # elementi in attesa di un posto nella finestra
+        self._pending = deque()
+        # elementi in attesa di un nuovo tentativo
+        self._retrying = []
+        # elementi in trasmissione, fuori dal lock
+        self._sending = 0
+        # ultimo transmit status per frame ID non ancora in volo:
+        # puo' arrivare prima che `transmit` abbia ritornato
+        self._early = dict()
+
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._inflight) + len(self._pending) + len(self._retrying)
+
+    @property
+    def window(self):
+        return self._window
+
+    @property
+    def inflight(self):
+        return len(self._inflight)
+
+    def send(self, address, data):
+        future = Future()
+        with self._cond:
+            if self._closed:
+                future.set_result(False)
+                return future
+            self._pending.append(_Entry(address, data, future))
+            self._cond.notify()
+        return future
+
+    def status(self, frame_id, success):
+        """Transmit status ricevuto per `frame_id`"""
+        with self._cond:
+            entry = self._inflight.pop(frame_id, None)
+            if entry is None:
+                self._early[frame_id] = (success, time.monotonic())
+                return
+            self._done(entry, success)
+
+    def _done(self, entry, success):
+        if success:
+            entry.future.set_result(True)
+        else:
+            self._retry(entry, time.monotonic())
+        self._cond.notify()
+
+    def close(self):
+        """I frame non ancora confermati valgono `False`"""
+        with self._cond:
+            self._closed = True
+            entries = list(self._inflight.values()) + list(self._pending) + self._retrying
+            self._inflight.clear()
+            self._pending.clear()
+            self._retrying = []
+            self._cond.notify()
+
+        for entry in entries:
+            entry.future.set_result(False)
+
+    def _retry(self, entry, now):
+        if entry.attempts > self._retries:
+            self.failed += 1
+            log.error(f'({entry.address}) frame not delivered after {entry.attempts} attempts')
+            entry.future.set_result(False)
+            return
+        self.retried += 1
+        entry.deadline = now + self._backoff * 2 ** (entry.attempts - 1)
+        self._retrying.append(entry)
+
+    def _ready(self, now):
+        """Elementi da trasmettere adesso, aggiorna
+        scadenze e nuovi tentativi
+        """
+        for frame_id, entry in list(self._inflight.items()):
+            if entry.deadline <= now:
+                # nessun transmit status entro il timeout
+                del self._inflight[frame_id]
+                self._retry(entry, now)
+
+        ready = [entry for entry in self._retrying if entry.deadline <= now]
+        if ready:
+            self._retrying = [entry for entry in self._retrying if entry.deadline > now]
+            # i nuovi tentativi hanno la precedenza
+            self._pending.extendleft(reversed(ready))
+
+        res = []
+        while self._pending and len(self._inflight) + self._sending < self._window:
+            res.append(self._pending.popleft())
+            self._sending += 1
+        return res
+
+    def _wait(self, now):
+        deadlines = [entry.deadline for entry in self._inflight.values()]
+        deadlines += [entry.deadline for entry in self._retrying]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - now)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    now = time.monotonic()
+                    ready = self._ready(now)
+                    if ready:
+                        break
+                    self._cond.wait(self._wait(now))
+
+            for entry in ready:
+                self._send(entry)
+
+    def _send(self, entry):
+        entry.attempts += 1
+        start = time.monotonic()
+        try:
+            frame_id = self._transmit(entry.address, entry.data)
+        except Exception:
+            # senza antenna non ha senso riprovare
+            log.exception(f'({entry.address}) frame not sent')
+            frame_id = None
+
+        with self._cond:
+            self._sending -= 1
+            self._cond.notify()
+            if frame_id is None or self._closed:
+                self.failed += frame_id is None
+                entry.future.set_result(False)
+                return
+
+            self.sent += 1
+            early = self._early.pop(frame_id, None)
+            if early and early[1] >= start:
+                self._done(entry, early[0])
+                return
+
+            entry.deadline = time.monotonic() + self._timeout
+            self._inflight[frame_id] = entry
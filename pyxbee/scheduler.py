@@ -0,0 +1,229 @@
+import logging
+import threading
+import time
+
+from collections import deque
+
+from .const import SEND_PRIORITY
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Limita un flusso a `rate` pacchetti al secondo,
+    con raffiche fino a `burst` pacchetti
+
+    :param rate: `float`
+        Pacchetti al secondo
+    :param burst: `int`
+        DEFAULT: `1`
+    """
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0 or burst < 1:
+            raise ValueError('rate and burst must be positive')
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def burst(self):
+        return self._burst
+
+    def _refill(self, now):
+        if now > self._stamp:
+            self._tokens = min(self._burst, self._tokens + (now - self._stamp) * self._rate)
+            self._stamp = now
+
+    def delay(self, now=None):
+        """Secondi da attendere prima che ci sia un gettone"""
+        self._refill(time.monotonic() if now is None else now)
+        return max(0.0, (1 - self._tokens) / self._rate)
+
+    def take(self, now=None):
+        """Consuma un gettone, ritorna `False` se non ce ne sono"""
+        self._refill(time.monotonic() if now is None else now)
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class Scheduler:
+    """
+    Coda di invio davanti all'antenna: i pacchetti partono in
+    ordine di priorita' del tipo (prima i tipi protetti, i
+    comandi verso il pilota) e, a parita' di priorita', in
+    ordine di arrivo.
+
+    I limiti di banda sono token bucket per tipo e per
+    indirizzo: un pacchetto parte solo se entrambi hanno un
+    gettone, senza bloccare i pacchetti degli altri flussi.
+    Per i tipi in `coalesce` conta solo l'ultimo valore: un
+    pacchetto ancora in coda per lo stesso indirizzo viene
+    sostituito dal nuovo, mantenendo la sua posizione
+
+    :param send: `callable`
+        Funzione `send(address, packet)` che invia il pacchetto
+    :param priorities: `dict`
+        `tipo -> priorita'`, zero e' la piu' alta
+        DEFAULT: `SEND_PRIORITY`
+    :param rates: `dict`
+        `tipo -> (rate, burst)` dei limiti per tipo
+        DEFAULT: `None`
+    :param address_rate: `tuple`
+        `(rate, burst)` applicato a ogni indirizzo
+        DEFAULT: `None`
+    :param coalesce: `tuple`
+        Tipi per cui conta solo l'ultimo pacchetto
+        DEFAULT: `('0', '1')` (DATA e STATE)
+    """
+
+    def __init__(self, send, priorities=None, rates=None, address_rate=None,
+                 coalesce=('0', '1')):
+        self._send = send
+        self._priorities = dict(SEND_PRIORITY if priorities is None else priorities)
+        self._lowest = max(self._priorities.values(), default=0)
+        self._type_buckets = {tipo: TokenBucket(*rate) for tipo, rate in (rates or {}).items()}
+        self._address_rate = address_rate
+        self._address_buckets = dict()
+        self._coalesce = frozenset(coalesce)
+
+        # priorita' -> deque di elementi `[indirizzo, tipo, pacchetto]`
+        self._queues = dict()
+        # `(indirizzo, tipo) -> elemento` ancora in coda
+        self._latest = dict()
+        self._pending = 0
+        self._sending = False
+
+        lock = threading.Lock()
+        self._cond = threading.Condition(lock)
+        self._done = threading.Condition(lock)
+        self._closed = False
+
+        self.sent = 0
+        self.coalesced = 0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return self._pending
+
+    def priority(self, tipo):
+        return self._priorities.get(tipo, self._lowest)
+
+    def put(self, address, packet):
+        tipo = packet.tipo
+
+        with self._cond:
+            if self._closed:
+                return False
+
+            key = (address, tipo)
+            if tipo in self._coalesce:
+                entry = self._latest.get(key)
+                if entry is not None:
+                    entry[2] = packet
+                    self.coalesced += 1
+                    return True
+
+            entry = [address, tipo, packet]
+            if tipo in self._coalesce:
+                self._latest[key] = entry
+
+            level = self.priority(tipo)
+            queue = self._queues.get(level)
+            if queue is None:
+                queue = self._queues[level] = deque()
+            queue.append(entry)
+
+            self._pending += 1
+            self._cond.notify()
+        return True
+
+    def join(self, timeout=None):
+        """Aspetta che tutti i pacchetti in coda siano
+        partiti, ritorna `False` se scade il timeout
+        """
+        with self._cond:
+            return self._done.wait_for(
+                lambda: not self._pending and not self._sending, timeout)
+
+    def close(self, timeout=None):
+        """I pacchetti ancora in coda partono
+        subito, senza limiti di banda
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _address_bucket(self, address):
+        if self._address_rate is None:
+            return None
+        bucket = self._address_buckets.get(address)
+        if bucket is None:
+            bucket = self._address_buckets[address] = TokenBucket(*self._address_rate)
+        return bucket
+
+    def _next(self, now):
+        """Ritorna `(elemento, attesa)`: il prossimo pacchetto
+        da inviare o, se sono tutti limitati, quanto aspettare
+        """
+        wait = None
+        for level in sorted(self._queues):
+            queue = self._queues[level]
+            for i, entry in enumerate(queue):
+                buckets = [b for b in (self._type_buckets.get(entry[1]),
+                                       self._address_bucket(entry[0])) if b]
+                if not self._closed:
+                    delay = max((b.delay(now) for b in buckets), default=0)
+                    if delay > 0:
+                        wait = delay if wait is None else min(wait, delay)
+                        continue
+
+                for bucket in buckets:
+                    bucket.take(now)
+                del queue[i]
+                if not queue:
+                    del self._queues[level]
+                return entry, None
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    entry, wait = self._next(time.monotonic())
+                    if entry or (self._closed and not self._pending):
+                        break
+                    self._cond.wait(wait)
+
+                if entry is None:
+                    return
+
+                address, tipo, packet = entry
+                if tipo in self._coalesce:
+                    self._latest.pop((address, tipo), None)
+                self._pending -= 1
+                self._sending = True
+
+            try:
+                self._send(address, packet)
+            except Exception:
+                log.exception(f'({address}) scheduled packet not sent')
+            finally:
+                with self._cond:
+                    self.sent += 1
+                    self._sending = False
+                    if not self._pending:
+                        self._done.notify_all()
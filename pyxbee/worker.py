@@ -0,0 +1,184 @@
+import logging
+import threading
+
+from collections import deque
+
+from .const import RECEIVE_QUEUE
+
+log = logging.getLogger(__name__)
+
+# politiche quando la coda e' piena
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+
+
+class ReceiveQueue:
+    """
+    Coda limitata tra il thread di lettura di digi-xbee e
+    un pool di worker che decodificano e smistano i pacchetti.
+    Il thread di lettura si limita ad accodare i bytes ricevuti,
+    cosi' un listener lento non blocca l'antenna.
+
+    Quando la coda e' piena viene scartato un pacchetto non
+    protetto: con `DROP_OLDEST` il DATA piu' vecchio in coda
+    (o, se non ce ne sono, il piu' vecchio non protetto), con
+    `DROP_NEWEST` quello appena arrivato. I tipi protetti non
+    vengono mai scartati, se serve superano il limite della coda
+
+    :param handler: `callable`
+        Funzione `handler(raw)` chiamata dai worker
+    :param peek: `callable`
+        Funzione `peek(raw)` che ritorna il tipo del pacchetto
+        senza decodificarlo, `None` se non e' riconoscibile
+    :param workers: `int`
+        Numero di thread worker
+        DEFAULT: `1`
+    :param maxsize: `int`
+        DEFAULT: `256`
+    :param policy: `str`
+        `DROP_OLDEST` o `DROP_NEWEST`
+        DEFAULT: `DROP_OLDEST`
+    :param protected: `tuple`
+        Tipi che non vengono mai scartati
+        DEFAULT: `()`
+    :param preferred: `str`
+        Tipo scartato per primo con `DROP_OLDEST`
+        DEFAULT: `'0'` (DATA)
+    """
+
+    def __init__(self, handler, peek, workers=1, maxsize=RECEIVE_QUEUE,
+                 policy=DROP_OLDEST, protected=(), preferred='0'):
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f'Invalid overflow policy: {policy}')
+        if workers < 1 or maxsize < 1:
+            raise ValueError('workers and maxsize must be positive')
+
+        self._handler = handler
+        self._peek = peek
+        self._maxsize = maxsize
+        self._policy = policy
+        self._protected = frozenset(protected)
+        self._preferred = preferred
+
+        # elementi `(tipo, raw)`
+        self._queue = deque()
+        lock = threading.Lock()
+        self._cond = threading.Condition(lock)
+        self._done = threading.Condition(lock)
+        self._unfinished = 0
+        self._closed = False
+
+        self.received = 0
+        self.dropped = 0
+        self.dropped_types = dict()
+        self.max_depth = 0
+
+        self._threads = [threading.Thread(target=self._run, daemon=True)
+                         for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def __len__(self):
+        return len(self._queue)
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @property
+    def policy(self):
+        return self._policy
+
+    @property
+    def workers(self):
+        return len(self._threads)
+
+    def _victim(self, tipo):
+        """Indice in coda del pacchetto da scartare, `-1` per
+        quello in arrivo, `None` se nessuno puo' essere scartato
+        """
+        incoming = -1 if tipo not in self._protected else None
+        if self._policy == DROP_NEWEST and incoming is not None:
+            return incoming
+
+        unprotected = None
+        for i, (queued, _) in enumerate(self._queue):
+            if queued == self._preferred:
+                return i
+            if unprotected is None and queued not in self._protected:
+                unprotected = i
+
+        return unprotected if unprotected is not None else incoming
+
+    def _drop(self, tipo):
+        self.dropped += 1
+        self.dropped_types[tipo] = self.dropped_types.get(tipo, 0) + 1
+
+    def put(self, raw):
+        tipo = self._peek(raw)
+
+        with self._cond:
+            if self._closed:
+                return False
+
+            self.received += 1
+            if len(self._queue) >= self._maxsize:
+                victim = self._victim(tipo)
+                if victim == -1:
+                    self._drop(tipo)
+                    return False
+                if victim is not None:
+                    item = self._queue[victim]
+                    del self._queue[victim]
+                    self._unfinished -= 1
+                    self._drop(item[0])
+                    if self._unfinished == 0:
+                        self._done.notify_all()
+
+            self._queue.append((tipo, raw))
+            self._unfinished += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify()
+        return True
+
+    def join(self, timeout=None):
+        """Aspetta che tutti i pacchetti in coda siano stati
+        gestiti, ritorna `False` se scade il timeout
+        """
+        with self._cond:
+            return self._done.wait_for(lambda: self._unfinished == 0, timeout)
+
+    def close(self, timeout=None):
+        """I pacchetti gia' in coda vengono gestiti
+        prima di fermare i worker
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                _, raw = self._queue.popleft()
+
+            try:
+                self._handler(raw)
+            except Exception:
+                log.exception('Received packet not handled')
+            finally:
+                with self._cond:
+                    self._unfinished -= 1
+                    if self._unfinished == 0:
+                        self._done.notify_all()
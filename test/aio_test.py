@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+from pyxbee import AsyncClient, AsyncServer, Bike, Packet, Taurus
+
+from test import test_packet
+
+
+class _Message:
+    def __init__(self, data):
+        self.data = bytearray(data)
+
+
+class TestAsync:
+    """
+    Questo test puo' essere eseguito
+    con l'antenna NON collegata
+    """
+
+    def setup(self):
+        self.loop = asyncio.new_event_loop()
+
+    def teardown(self):
+        self.loop.close()
+
+    def _receive(self, transmitter, packet):
+        # il callback di digi-xbee arriva da un altro thread
+        message = _Message(packet.encode.encode('utf-8'))
+        thread = threading.Thread(target=transmitter.transmitter.receiver, args=(message,))
+        thread.start()
+        thread.join()
+
+    def test_receive(self):
+        server = AsyncServer(loop=self.loop)
+        taurus = Taurus('X', 'listenerX', server=server.transmitter)
+
+        data = Packet(dict(test_packet[Packet.Type.DATA]))
+        state = Packet(dict(test_packet[Packet.Type.STATE]))
+
+        async def main():
+            self._receive(server, data)
+            self._receive(server, state)
+
+            res = []
+            async for packet in server:
+                res.append(packet)
+                if len(res) == 2:
+                    break
+            return res
+
+        res = self.loop.run_until_complete(main())
+        assert [p.encode for p in res] == [data.encode, state.encode]
+        assert taurus.data == res[0].jsonify
+
+    def test_maxsize(self):
+        client = AsyncClient(loop=self.loop, maxsize=1)
+        bike = Bike('X', 'serverX', client=client.transmitter)
+
+        notice = Packet(dict(test_packet[Packet.Type.NOTICE]))
+        data = Packet(dict(test_packet[Packet.Type.DATA]))
+
+        async def main():
+            self._receive(client, notice)
+            self._receive(client, data)
+            # lascia eseguire i callback arrivati dal thread
+            await asyncio.sleep(0)
+            return await client.receive()
+
+        res = self.loop.run_until_complete(main())
+        assert res.tipo == Packet.Type.DATA
+        assert client.dropped == 1
+        assert len(bike) == 2
+
+    def test_send(self):
+        server = AsyncServer(loop=self.loop)
+        data = dict(test_packet[Packet.Type.DATA])
+
+        async def main():
+            await server.send('0013A20041C7BFF4', data)
+            return await server.send_sync('0013A20041C7BFF4', data)
+
+        # senza antenna l'ack non arriva
+        assert self.loop.run_until_complete(main()) is False
+        # send_sync aspetta il future dell'invio affidabile
+        assert server.transmitter._reliable.failed > 0
+        server.close()
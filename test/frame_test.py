@@ -0,0 +1,147 @@
+import time
+import pytest
+
+# pylint: disable=wildcard-import,unused-wildcard-import
+from pyxbee.exception import *
+from pyxbee.frame import (Aggregator, Reassembler, aggregate, fragment,
+                          is_aggregate, is_fragment, split)
+from pyxbee import Server, Taurus, Packet
+
+from test import test_packet
+
+
+class _Message:
+    def __init__(self, data):
+        self.data = bytearray(data)
+
+
+class TestFrame:
+    def setup(self):
+        self.frames = list()
+
+    def _send(self, address, frame):
+        self.frames.append((address, frame))
+
+    def test_aggregate(self):
+        payloads = [b'a;0;1', b'\x80\x01X', b'c' * 50]
+        frame = aggregate(payloads)
+
+        assert is_aggregate(frame)
+        assert split(frame) == payloads
+
+        # un pacchetto solo resta invariato
+        assert aggregate([b'a;0;1']) == b'a;0;1'
+        assert split(b'a;0;1') == [b'a;0;1']
+
+        with pytest.raises(InvalidFieldsException):
+            split(frame[:-1])
+
+        with pytest.raises(InvalidFieldsException):
+            aggregate([b'a' * 256, b'b'])
+
+    def test_aggregator(self):
+        aggregator = Aggregator(self._send, max_payload=20, flush_interval=0.01)
+
+        aggregator.put('A', b'12345')
+        aggregator.put('B', b'abc')
+        aggregator.put('A', b'6789')
+        assert self.frames == []
+
+        time.sleep(0.1)
+        assert sorted(self.frames) == [('A', aggregate([b'12345', b'6789'])),
+                                       ('B', b'abc')]
+
+        # il frame pieno parte senza aspettare
+        self.frames.clear()
+        aggregator.put('A', b'x' * 8)
+        aggregator.put('A', b'y' * 8)
+        aggregator.put('A', b'z' * 8)
+        assert self.frames == [('A', aggregate([b'x' * 8, b'y' * 8]))]
+
+        # un pacchetto troppo grande parte da solo, dopo quelli accodati
+        aggregator.put('A', b'w' * 30)
+        assert self.frames[1:] == [('A', b'z' * 8), ('A', b'w' * 30)]
+
+        self.frames.clear()
+        aggregator.put('C', b'abc')
+        aggregator.close()
+        assert self.frames == [('C', b'abc')]
+
+    def test_receiver(self):
+        server = Server()
+        tau0 = Taurus('0', 'listener0', server=server)
+        tau1 = Taurus('1', 'listener1', server=server)
+
+        data0 = dict(test_packet[Packet.Type.DATA])
+        data0['dest'] = '0'
+        packet0 = Packet(data0)
+
+        data1 = dict(test_packet[Packet.Type.DATA])
+        data1['dest'] = '1'
+        packet1 = Packet(data1)
+
+        server.receiver(_Message(aggregate([packet0.encode.encode(),
+                                            packet1.encode_binary])))
+
+        assert tau0.data == packet0.jsonify
+        assert tau1.data == Packet(packet1.encode_binary).jsonify
+
+    def test_fragment(self):
+        data = bytes(range(256)) * 2
+        frames = fragment(data, 100, 7)
+
+        assert len(frames) == 6
+        assert all(is_fragment(frame) and len(frame) <= 100 for frame in frames)
+
+        reassembler = Reassembler()
+        for frame in reversed(frames[1:]):
+            assert reassembler.feed('A', frame) is None
+        # frammenti di un'altra sorgente non si mescolano
+        assert reassembler.feed('B', frames[0]) is None
+        assert reassembler.feed('A', frames[0]) == data
+        assert len(reassembler) == 1
+
+        with pytest.raises(InvalidFieldsException):
+            fragment(b'x' * 1000, 4, 0)
+
+        with pytest.raises(InvalidFieldsException):
+            reassembler.feed('A', frames[0][:2])
+
+    def test_reassembler_bounds(self):
+        frames = fragment(b'x' * 300, 100, 1)
+
+        reassembler = Reassembler(timeout=0.05, max_buffers=2)
+        reassembler.feed('A', frames[0])
+        time.sleep(0.1)
+
+        # il buffer scaduto viene eliminato al frammento successivo
+        assert reassembler.feed('A', frames[1]) is None
+        assert reassembler.expired == 1
+        assert len(reassembler) == 1
+
+        reassembler.feed('B', frames[0])
+        reassembler.feed('C', frames[0])
+        assert reassembler.evicted == 1
+        assert len(reassembler) == 2
+
+    def test_send_fragments(self):
+        Packet.secret_key = b"test_key"
+        try:
+            server = Server(max_payload=40)
+            server._send_frame = self._send
+
+            message = dict(test_packet[Packet.Type.MESSAGE])
+            message['messaggio'] = 'm' * 150
+            packet = Packet(message)
+            server.send('A', packet)
+
+            assert len(self.frames) > 1
+            assert all(len(frame) <= 40 for _, frame in self.frames)
+
+            tau = Taurus('X', 'listenerX', server=server)
+            for _, frame in self.frames:
+                server.receiver(_Message(frame))
+
+            assert tau._memoize[Packet.Type.MESSAGE].dictify == packet.dictify
+        finally:
+            Packet.secret_key = None
@@ -6,10 +6,19 @@ from hashlib import blake2s
 # pylint: disable=wildcard-import,unused-wildcard-import
 from pyxbee.exception import *
 from pyxbee import Packet
+from pyxbee.packet import DeltaEncoder
 
 from test import test_packet, json_path
 
 
+def _typed(tester):
+    """Valori attesi dopo la conversione dei campi con un tipo"""
+    conv = {'float': float, 'double': float, 'int': int}
+    schema = Packet._PACKETS[tester['type']]
+    return {key: conv[schema[key]](val) if schema[key] in conv else val
+            for key, val in tester.items()}
+
+
 class TestPacket:
     def setup(self):
         Packet.secret_key = None
@@ -21,14 +30,15 @@ class TestPacket:
             tester_list = list(tester_tuple)
             tester_str = ';'.join(map(str, tester.values()))
 
-            # load con dizionario
+            # load con dizionario, i valori vengono convertiti
+            expected = _typed(tester)
             p1 = Packet(tester)
             print(p1)
-            assert p1.jsonify == json.dumps(tester)
-            assert p1.dictify == tester
-            assert p1.content == tester_tuple
+            assert p1.jsonify == json.dumps(expected)
+            assert p1.dictify == expected
+            assert p1.content == tuple(expected.values())
             assert len(p1) == len(tester)
-            assert str(p1) == str(tester)
+            assert str(p1) == str(expected)
 
             # per la comparazione di due packetti uguali
             p2 = Packet(tester)
@@ -86,7 +96,8 @@ class TestPacket:
         tester = dict(test_packet[Packet.Type.DATA])
         p1 = Packet(tester)
 
-        assert p1.content == tuple(tester.values())
+        assert p1.content == tuple(_typed(tester).values())
+        assert all(isinstance(val, float) for val in p1.value)
 
         tester2 = dict(test_packet[Packet.Type.DATA])
         tester2['gear'] = 11
@@ -185,11 +196,11 @@ class TestPacket:
 
             p1 = Packet(tester)
             h1 = blake2s(key=Packet.secret_key, digest_size=16)
-            h1.update(json.dumps(p1.raw_data).encode('utf-8'))
+            h1.update(p1.canonical)
 
             p2 = Packet(tester, nonce=False)
             h2 = blake2s(key=Packet.secret_key, digest_size=16)
-            h2.update(json.dumps(p2.raw_data).encode('utf-8'))
+            h2.update(p2.canonical)
 
             assert p1.digest == h1.hexdigest()
             assert p1.digest != h2.hexdigest()
@@ -198,3 +209,265 @@ class TestPacket:
             assert p2.digest == h2.hexdigest()
 
             assert p1.digest != p2.digest
+
+    def test_binary(self):
+        for tipo in test_packet.keys():
+            tester = dict(test_packet[tipo])
+            p1 = Packet(tester)
+
+            raw = p1.encode_binary
+            assert isinstance(raw, bytes)
+            assert raw[0] & 0x80
+
+            p2 = Packet(raw)
+            assert p2.dest == p1.dest
+            assert p2.tipo == p1.tipo
+            assert len(p2) == len(p1)
+            assert p2.encode_binary == raw
+
+            schema = Packet._PACKETS[tipo]
+            for key, val in p2.dictify.items():
+                if schema[key] == 'double':
+                    assert val == float(tester[key])
+                elif schema[key] == 'int':
+                    assert val == int(tester[key])
+                else:
+                    assert val == tester[key]
+
+            # il formato testuale in bytes resta valido
+            p3 = Packet(p1.encode.encode())
+            assert p3.dictify == Packet(p1.encode).dictify
+
+        data = Packet(dict(test_packet[Packet.Type.DATA]))
+        assert len(data.encode_binary) < len(data.encode.encode()) / 2
+
+        # i double tornano identici al formato testuale
+        tester = dict(test_packet[Packet.Type.DATA], speed='45.67', time='1700000000.125')
+        p = Packet(Packet(tester).encode_binary)
+        assert p.jsonify == Packet(Packet(tester).encode).jsonify
+
+        # un dest non ascii si confonderebbe col tag binario
+        tester['dest'] = 'é'
+        with pytest.raises(InvalidFieldsException):
+            Packet(tester)
+        with pytest.raises(InvalidFieldsException):
+            Packet(';'.join(tester.values()).encode('utf-8'))
+
+    def test_binary_digest(self):
+        Packet.secret_key = b"test_key"
+
+        for tipo in Packet().protected_type:
+            tester = dict(test_packet[tipo])
+
+            p1 = Packet(tester)
+            p2 = Packet(p1.encode_binary)
+            assert p2.nonce == p1.nonce
+            assert p2.digest == p1.digest
+
+            p1 = Packet(tester, nonce=False)
+            p2 = Packet(p1.encode_binary)
+            assert p2.nonce is None
+            assert p2.digest == p1.digest
+
+    def test_binary_wrong(self):
+        raw = Packet(dict(test_packet[Packet.Type.DATA])).encode_binary
+
+        with pytest.raises(InvalidFieldsException):
+            Packet(raw[:-1])
+
+        with pytest.raises(InvalidFieldsException):
+            Packet(raw + b'\x00')
+
+        with pytest.raises(InvalidTypeException):
+            Packet(bytes([0x80 | 0x1F]) + raw[1:])
+
+    def test_trailer(self):
+        Packet.secret_key = b"test_key"
+
+        for tipo in Packet().protected_type:
+            tester = dict(test_packet[tipo])
+
+            # un pacchetto ricevuto mantiene nonce e digest originali
+            p1 = Packet(tester)
+            p2 = Packet(p1.encode)
+            assert p2.nonce == p1.nonce
+            assert p2.digest == p1.digest
+            assert p2.content == p1.content
+
+            p1 = Packet(tester, nonce=False)
+            p2 = Packet(p1.encode)
+            assert p2.nonce is None
+            assert p2.digest == p1.digest
+
+        # i tipi non protetti non accettano campi in coda
+        data = Packet(dict(test_packet[Packet.Type.DATA]))
+        with pytest.raises(InvalidFieldsException):
+            Packet(data.encode + ';1;abc')
+
+    def test_lazy(self):
+        for tipo in test_packet.keys():
+            tester = dict(test_packet[tipo])
+            p1 = Packet(tester)
+
+            for raw in (p1.encode, p1.encode.encode(), p1.encode_binary):
+                p2 = Packet(raw, lazy=True)
+                assert not p2.decoded
+                assert p2.dest == p1.dest
+                assert p2.tipo == p1.tipo
+                assert not p2.decoded
+
+                assert p2.dictify == Packet(raw).dictify
+                assert p2.decoded
+                assert p2.dest == p1.dest
+
+        # il tipo viene controllato subito, i campi al primo accesso
+        with pytest.raises(InvalidTypeException):
+            Packet('0;a;b', lazy=True)
+
+        p = Packet('X;0;1', lazy=True)
+        assert p.tipo == Packet.Type.DATA
+        with pytest.raises(InvalidFieldsException):
+            p.content_dict
+
+        # intestazione incompleta, decodifica subito
+        with pytest.raises(InvalidFieldsException):
+            Packet('X;2', lazy=True)
+
+    def test_verify(self):
+        Packet.secret_key = b"test_key"
+
+        for tipo in Packet().protected_type:
+            tester = dict(test_packet[tipo])
+            p1 = Packet(tester)
+            assert p1.verify()
+
+            # il digest non dipende dal formato di trasmissione
+            assert Packet(p1.encode).verify()
+            assert Packet(p1.encode_binary).verify()
+            assert Packet(p1.encode, lazy=True).verify()
+
+            # un pacchetto ricevuto senza digest non viene firmato
+            unsigned = Packet(Packet(tester, nonce=False).encode.rsplit(';', 1)[0]
+                              + ';' + '0' * 32)
+            assert not unsigned.verify()
+
+            forged = dict(p1.dictify)
+            forged['dest'] = 'Y'
+            assert not Packet(forged).verify()
+
+            Packet.secret_key = b"other_key"
+            assert not Packet(p1.encode).verify()
+            Packet.secret_key = b"test_key"
+
+    def test_legacy_digest(self):
+        Packet.secret_key = b"test_key"
+        tester = dict(test_packet[Packet.Type.SETTING])
+
+        content = Packet(tester, nonce=False).raw_data
+        content['digest'] = Packet.calculate_digest(content)
+        p = Packet(content)
+
+        try:
+            assert not p.verify()
+            Packet.legacy_digest = True
+            assert p.verify()
+        finally:
+            Packet.legacy_digest = False
+
+    def test_delta(self):
+        tester = dict(test_packet[Packet.Type.DATA])
+        p1 = Packet(tester)
+
+        key = Packet(p1.encode_keyframe(7))
+        assert key.keyframe and key.seq == 7
+        assert key.dictify == Packet(p1.encode_binary).dictify
+
+        tester2 = dict(tester)
+        tester2['power'] = '123.5'
+        tester2['gear'] = '3'
+        p2 = Packet(tester2)
+
+        raw = p2.encode_delta(7, p1.dictify)
+        assert len(raw) < len(p2.encode_binary)
+
+        delta = Packet(raw)
+        assert not delta.keyframe and delta.seq == 7
+        assert delta.dictify == {'dest': 'X', 'type': Packet.Type.DATA,
+                                 'power': 123.5, 'gear': 3.0}
+
+        # senza cambiamenti viaggiano solo le intestazioni
+        assert Packet(p1.encode_delta(7, p1.dictify)).dictify == \
+            {'dest': 'X', 'type': Packet.Type.DATA}
+
+        with pytest.raises(InvalidFieldsException):
+            Packet(raw[:-1])
+
+        # i pacchetti normali non hanno sequenza
+        assert p1.seq is None and not p1.keyframe
+
+    def test_delta_encoder(self):
+        encoder = DeltaEncoder(keyframe_interval=2, keyframe_retry=1.0)
+        p = Packet(dict(test_packet[Packet.Type.DATA]))
+
+        # un solo keyframe in volo, intanto partono pacchetti completi
+        first, keyframe, _ = encoder.encode(p, now=0)
+        assert keyframe and encoder.pending == first
+        seq, keyframe, frame = encoder.encode(p, now=0.5)
+        assert seq is None and not keyframe and frame == p.encode_binary
+
+        # il keyframe fallito viene ritentato solo dopo keyframe_retry
+        encoder.fail(first, now=0.5)
+        assert encoder.encode(p, now=1.0)[0] is None
+        seq, keyframe, _ = encoder.encode(p, now=1.5)
+        assert keyframe and seq == (first + 1) & 0xFFFF
+
+        encoder.ack(seq)
+        assert encoder.reference[0] == seq
+
+        for _ in range(2):
+            res, keyframe, frame = encoder.encode(p, now=1.5)
+            assert not keyframe and res == seq
+            assert Packet(frame).seq == seq
+
+        # il nuovo keyframe non ferma i delta sul precedente
+        new, keyframe, _ = encoder.encode(p, now=2.0)
+        assert keyframe and new == (seq + 1) & 0xFFFF
+        assert encoder.encode(p, now=2.0)[:2] == (seq, False)
+        encoder.ack(new)
+        assert encoder.encode(p, now=2.0)[:2] == (new, False)
+
+    def test_typed(self):
+        p = Packet('X;5;ciao;3;1.5;')
+        assert p.dictify == {'dest': 'X', 'type': '5', 'messaggio': 'ciao',
+                             'priorita': 3, 'durata': 1.5, 'timeout': None}
+
+        p = Packet('X;1;true;False;1;0;TRUE;false;true;true;false')
+        assert p.value == (True, False, True, False, True, False, True, True, False)
+
+        with pytest.raises(InvalidFieldsException):
+            Packet('X;5;ciao;tre;1.5;2')
+
+    def test_empty_fields(self):
+        p = Packet('X;5;ciao;;1.5;')
+        assert p.encode == 'X;5;ciao;;1.5;'
+        assert Packet(p.encode).dictify == p.dictify
+        assert Packet(p.encode_binary).dictify == p.dictify
+
+        data = {key: '0.5' for key in test_packet[Packet.Type.DATA]}
+        data.update({'dest': 'X', 'type': Packet.Type.DATA, 'speed': None})
+        p = Packet(data)
+        assert Packet(p.encode).dictify == p.dictify
+        assert Packet(p.encode_binary).dictify == p.dictify
+        assert Packet(p.encode_keyframe(1)).dictify == p.dictify
+
+        # il campo vuoto cambia rispetto al keyframe
+        reference = dict(p.dictify, speed=0.5)
+        delta = Packet(p.encode_delta(1, reference))
+        assert 'speed' in delta.dictify and delta.dictify['speed'] is None
+
+        # i campi senza tipo restano stringhe
+        Packet.protocol({'9': {'dest': '', 'type': '9', 'a': '', 'b': ''}})
+        try:
+            assert Packet('X;9;1.5;true').value == ('1.5', True)
+        finally:
+            Packet.protocol()
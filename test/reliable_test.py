@@ -0,0 +1,130 @@
+import threading
+import time
+
+from digi.xbee.models.status import TransmitStatus
+from digi.xbee.packets.aft import ApiFrameType
+
+from pyxbee import Server, Packet
+from pyxbee.reliable import ReliableSender, gather
+
+from test import test_packet
+
+
+class _Status:
+    def __init__(self, frame_id, status=TransmitStatus.SUCCESS):
+        self.frame_id = frame_id
+        self.transmit_status = status
+
+    def get_frame_type(self):
+        return ApiFrameType.TRANSMIT_STATUS
+
+
+class TestReliable:
+    """
+    Questo test puo' essere eseguito
+    con l'antenna NON collegata
+    """
+
+    def setup(self):
+        self.frames = []
+        self.lock = threading.Lock()
+
+    def _transmit(self, address, data):
+        with self.lock:
+            self.frames.append((address, data))
+            return len(self.frames)
+
+    def _wait(self, size, timeout=1):
+        end = time.monotonic() + timeout
+        while len(self.frames) < size and time.monotonic() < end:
+            time.sleep(0.001)
+        time.sleep(0.01)
+        return len(self.frames)
+
+    def test_window(self):
+        sender = ReliableSender(self._transmit, window=2, timeout=10)
+        futures = [sender.send('A', bytes([i])) for i in range(4)]
+
+        # solo due frame in volo
+        assert self._wait(2) == 2
+        assert sender.inflight == 2 and len(sender) == 4
+
+        sender.status(2, True)
+        assert futures[1].result(1) is True
+        assert self._wait(3) == 3 and not futures[0].done()
+
+        for frame_id in (1, 3):
+            sender.status(frame_id, True)
+        assert self._wait(4) == 4
+        sender.status(4, True)
+
+        assert all(future.result(1) for future in futures)
+        assert sender.sent == 4 and sender.retried == 0
+        sender.close()
+
+    def test_retry(self):
+        sender = ReliableSender(self._transmit, window=4, retries=1, backoff=0.01)
+        first = sender.send('A', b'1')
+        second = sender.send('B', b'2')
+        assert self._wait(2) == 2
+
+        # viene ritrasmesso solo il frame fallito
+        sender.status(1, False)
+        sender.status(2, True)
+        assert self._wait(3) == 3
+        assert self.frames[2] == ('A', b'1')
+        assert second.result(1) is True
+
+        # finiti i tentativi il future vale False
+        sender.status(3, False)
+        assert first.result(1) is False
+        assert sender.retried == 1 and sender.failed == 1
+        sender.close()
+
+    def test_timeout(self):
+        sender = ReliableSender(self._transmit, timeout=0.02, retries=1, backoff=0.01)
+        future = sender.send('A', b'1')
+        assert self._wait(2) == 2
+        sender.status(2, True)
+        assert future.result(1) is True
+        sender.close()
+
+    def test_close(self):
+        sender = ReliableSender(self._transmit, timeout=10)
+        future = sender.send('A', b'1')
+        self._wait(1)
+        sender.close()
+        assert future.result(1) is False
+        assert sender.send('A', b'2').result(1) is False
+
+    def test_gather(self):
+        sender = ReliableSender(self._transmit, timeout=10)
+        future = gather([sender.send('A', b'1'), sender.send('A', b'2')])
+        self._wait(2)
+        sender.status(1, True)
+        assert not future.done()
+        sender.status(2, True)
+        assert future.result(1) is True
+        assert gather([]).result() is True
+        sender.close()
+
+    def test_transmitter(self):
+        packet = Packet(dict(test_packet[Packet.Type.SETTING]))
+
+        # senza antenna l'ack non arriva
+        server = Server()
+        assert server.send_reliable('0013A20041C7BFF4', packet).result() is False
+
+        server = Server(window=4, max_payload=40)
+        server._reliable._transmit = self._transmit
+        future = server.send_reliable('0013A20041C7BFF4', packet)
+
+        # il pacchetto viene frammentato, il future
+        # vale True quando arrivano tutti i frammenti
+        size = self._wait(3)
+        assert size > 1
+        for frame_id in range(1, size + 1):
+            assert not future.done()
+            server._transmit_status(_Status(frame_id))
+        assert future.result(1) is True
+        server.close()
@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from pyxbee import Server, Packet
+from pyxbee.scheduler import Scheduler, TokenBucket
+
+from test import test_packet
+
+
+class TestScheduler:
+    """
+    Questo test puo' essere eseguito
+    con l'antenna NON collegata
+    """
+
+    def setup(self):
+        self.sent = []
+        self.ready = threading.Event()
+        self.started = threading.Event()
+
+    def _send(self, address, packet):
+        # il primo invio blocca lo scheduler finche' serve
+        self.started.set()
+        self.ready.wait()
+        self.sent.append((address, packet.tipo, packet))
+
+    def _scheduler(self, **kwargs):
+        scheduler = Scheduler(self._send, **kwargs)
+        scheduler.put('first', Packet(dict(test_packet[Packet.Type.NOTICE])))
+        self.started.wait()
+        return scheduler
+
+    def _packet(self, tipo, **values):
+        content = dict(test_packet[tipo])
+        content.update(values)
+        return Packet(content)
+
+    def test_priority(self):
+        scheduler = self._scheduler()
+        for tipo in (Packet.Type.DATA, Packet.Type.STATE, Packet.Type.SIGNAL,
+                     Packet.Type.NOTICE, Packet.Type.MESSAGE):
+            scheduler.put('A', self._packet(tipo))
+        assert len(scheduler) == 5
+
+        self.ready.set()
+        assert scheduler.join(1)
+        assert [tipo for _, tipo, _ in self.sent[1:]] == [
+            Packet.Type.SIGNAL, Packet.Type.MESSAGE,
+            Packet.Type.STATE, Packet.Type.NOTICE, Packet.Type.DATA]
+        scheduler.close()
+
+    def test_coalesce(self):
+        scheduler = self._scheduler()
+        packets = [self._packet(Packet.Type.DATA, speed=str(i)) for i in range(5)]
+        for packet in packets:
+            scheduler.put('A', packet)
+        scheduler.put('B', packets[0])
+
+        assert len(scheduler) == 2
+        assert scheduler.coalesced == 4
+
+        self.ready.set()
+        assert scheduler.join(1)
+        assert [(addr, p) for addr, _, p in self.sent[1:]] == [('A', packets[-1]), ('B', packets[0])]
+        assert scheduler.sent == 3
+        scheduler.close()
+
+    def test_rate_limit(self):
+        scheduler = self._scheduler(rates={Packet.Type.DATA: (0.001, 1)},
+                                    address_rate=(0.001, 1), coalesce=())
+        for address, tipo in (('A', Packet.Type.DATA), ('C', Packet.Type.DATA),
+                              ('C', Packet.Type.DATA), ('A', Packet.Type.SIGNAL),
+                              ('A', Packet.Type.SIGNAL), ('B', Packet.Type.SIGNAL)):
+            scheduler.put(address, self._packet(tipo))
+
+        # il limite per indirizzo ferma il secondo SIGNAL e il
+        # DATA verso A, quello per tipo il secondo DATA verso C
+        self.ready.set()
+        assert not scheduler.join(0.2)
+        assert [(addr, tipo) for addr, tipo, _ in self.sent[1:]] == [
+            ('A', Packet.Type.SIGNAL), ('B', Packet.Type.SIGNAL), ('C', Packet.Type.DATA)]
+        assert len(scheduler) == 3
+
+        # alla chiusura la coda parte senza limiti
+        scheduler.close(1)
+        assert len(self.sent) == 7
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(10, 2)
+        now = 100.0
+        bucket._stamp = now
+
+        assert bucket.take(now) and bucket.take(now)
+        assert not bucket.take(now)
+        assert bucket.delay(now) == pytest.approx(0.1)
+        assert bucket.take(now + 0.11)
+        assert bucket.delay(now + 10) == 0
+
+        with pytest.raises(ValueError):
+            TokenBucket(0)
+
+    def test_transmitter(self):
+        server = Server(schedule=True)
+        sent = []
+        server._send_data = lambda address, data: sent.append(data)
+
+        packet = self._packet(Packet.Type.DATA)
+        server.send('0013A20041C7BFF4', packet)
+        assert server.scheduler.join(1)
+        assert sent == [packet.encode.encode('utf-8')]
+
+        server.close()
+        assert server.scheduler is None
@@ -3,11 +3,16 @@ import pytest
 
 # pylint: disable=wildcard-import,unused-wildcard-import
 from pyxbee.exception import *
-from pyxbee import Server, Taurus, Packet
+from pyxbee import Bike, Client, Server, Taurus, Packet
 
 from test import test_packet
 
 
+class _Message:
+    def __init__(self, data):
+        self.data = bytearray(data)
+
+
 class TestServer:
     """
     Questo test puo' essere eseguito
@@ -78,3 +83,149 @@ class TestServer:
         assert dest.setting == packet.jsonify
 
         # TODO: Inserire gli altri pacchetti
+
+    def test_receiver(self):
+        server = Server()
+        dest = Taurus('X', 'listenerX', server=server)
+
+        data = dict(test_packet[Packet.Type.DATA])
+        packet = Packet(data)
+        server.receiver(_Message(packet.encode.encode()))
+        assert dest.data == packet.jsonify
+
+        state = dict(test_packet[Packet.Type.STATE])
+        packet = Packet(state)
+        server.receiver(_Message(packet.encode_binary))
+        assert dest.state == packet.jsonify
+
+    def test_receiver_digest(self):
+        Packet.secret_key = b"test_key"
+        try:
+            server = Server()
+            dest = Taurus('X', 'listenerX', server=server)
+
+            setting = dict(test_packet[Packet.Type.SETTING])
+            packet1 = Packet(setting)
+            packet2 = Packet(setting)
+
+            server.receiver(_Message(packet1.encode.encode()))
+            assert dest.setting == packet1.jsonify
+
+            server.receiver(_Message(packet2.encode_binary))
+            assert dest.setting == Packet(packet2.encode_binary).jsonify
+
+            # un pacchetto gia' visto viene scartato
+            server.receiver(_Message(packet1.encode.encode()))
+            assert dest.setting == Packet(packet2.encode_binary).jsonify
+
+            forged = dict(Packet(setting).dictify)
+            forged['circonferenza'] = '0'
+            server.receiver(_Message(Packet(forged).encode.encode()))
+            assert dest.setting == Packet(packet2.encode_binary).jsonify
+        finally:
+            Packet.secret_key = None
+
+    def test_register(self, monkeypatch):
+        class _Remote:
+            created = 0
+
+            def __init__(self, device, address):
+                _Remote.created += 1
+                self.address = address
+
+        class _Device:
+            def __init__(self):
+                self.sent = []
+
+            def send_data_async(self, remote, data):
+                self.sent.append((remote, data))
+
+        monkeypatch.setattr('pyxbee.base.RemoteXBeeDevice', _Remote)
+
+        server = Server()
+        with pytest.raises(ValueError):
+            server.register('not an address')
+
+        # senza antenna viene convertito solo l'indirizzo
+        server.register('0013A20041C7BFF4')
+        assert _Remote.created == 0
+
+        server._device = _Device()
+        server.register('0013A20041C7BFF4', '0013A20041C7BFF5')
+        assert _Remote.created == 2
+
+        packet = Packet(dict(test_packet[Packet.Type.DATA]))
+        for _ in range(3):
+            server.send('0013A20041C7BFF4', packet)
+
+        remotes = {id(remote) for remote, _ in server.device.sent}
+        assert len(remotes) == 1 and _Remote.created == 2
+        server._device = None
+
+    def test_shared(self, monkeypatch):
+        class _Device:
+            opened = 0
+
+            def __init__(self, port, baud_rate):
+                self._open = False
+
+            def open(self):
+                _Device.opened += 1
+                self._open = True
+
+            def is_open(self):
+                return self._open
+
+            def close(self):
+                self._open = False
+
+            def get_64bit_addr(self):
+                return '0013A20041C7BFF4'
+
+            def add_data_received_callback(self, callback):
+                pass
+
+            add_packet_received_callback = add_data_received_callback
+
+        # senza antenna il server non viene condiviso,
+        # la chiamata successiva riprova ad aprirla
+        s1 = Server.shared('shared')
+        assert s1.device is None
+        assert Server.shared('shared') is not s1
+
+        monkeypatch.setattr('pyxbee.base.XBeeDevice', _Device)
+        server = Server.shared('shared')
+        try:
+            assert Server.shared('shared') is server
+            assert _Device.opened == 1
+
+            tau0 = Taurus('0', 'listener0', 'shared')
+            tau1 = Taurus('1', 'listener1', 'shared')
+            assert tau0.transmitter is tau1.transmitter is server
+
+            # la porta e' gia' usata da un server
+            with pytest.raises(InvalidInstanceException):
+                Client.shared('shared')
+
+            # un'antenna chiusa viene riaperta
+            server.device.close()
+            other = Server.shared('shared')
+            assert other is not server and _Device.opened == 2
+            other.close()
+        finally:
+            server.close()
+
+        assert not Server._SHARED
+
+        client = Client.shared()
+        try:
+            bike = Bike('0', 'server0')
+            assert bike.transmitter is client
+
+            # un client gestisce una sola bici
+            with pytest.raises(InvalidInstanceException):
+                Bike('1', 'server1')
+        finally:
+            client.close()
+
+        assert not Server._SHARED
@@ -1,6 +1,7 @@
 import json
 import pytest
 import random
+import time
 
 # pylint: disable=wildcard-import,unused-wildcard-import
 from pyxbee.exception import *
@@ -253,3 +254,114 @@ class TestTaurus:
         p = Packet()
 
         assert p.secret_key == key
+
+    def test_jsonify_cache(self):
+        packet1 = Packet(dict(test_packet[Packet.Type.DATA]))
+        self.taurus.receive(packet1)
+
+        data = self.taurus.data
+        assert data == packet1.jsonify
+        assert self.taurus.data is data
+        assert packet1.jsonify is packet1.jsonify
+
+        # letture ripetute non duplicano la history
+        assert self.taurus.history == [data]
+
+        tester = dict(test_packet[Packet.Type.DATA])
+        tester['gear'] = '11'
+        packet2 = Packet(tester)
+        self.taurus.receive(packet2)
+
+        assert self.taurus.data == packet2.jsonify
+        assert self.taurus.data is not data
+        assert self.taurus.history == [data, packet2.jsonify]
+
+    def test_invalid(self):
+        class _Message:
+            def __init__(self, data):
+                self.data = bytearray(data)
+
+        packet = Packet(dict(test_packet[Packet.Type.DATA]))
+        self.server.receiver(_Message(packet.encode.encode('utf-8')))
+        assert self.taurus.data == packet.jsonify
+
+        class _Web:
+            def __init__(self):
+                self.data = []
+
+            def send_data(self, data):
+                self.data.append(data)
+
+        # l'intestazione e' valida, il contenuto no: il pacchetto
+        # viene scartato alla prima lettura e non va al frontend
+        self.server.web = _Web()
+        self.server.receiver(_Message(b'X;0;garbage'))
+        assert self.server.web.data == []
+        assert self.taurus.data == packet.jsonify
+        assert self.taurus.data == packet.jsonify
+
+        self.server.receiver(_Message(b'X;1;garbage'))
+        assert self.taurus.state == {}
+
+        assert not Packet(b'X;0;garbage', lazy=True).valid
+        assert packet.valid
+
+    def test_delta(self):
+        tester = dict(test_packet[Packet.Type.DATA])
+        tester['dest'] = 'X'
+        p1 = Packet(tester)
+
+        # delta senza keyframe: scartato
+        self.taurus.receive(Packet(p1.encode_delta(1, p1.dictify)))
+        assert self.taurus.data == {}
+
+        key = Packet(p1.encode_keyframe(1))
+        self.taurus.receive(key)
+        assert self.taurus.data == key.jsonify
+
+        tester2 = dict(tester)
+        tester2['speed'] = '42.0'
+        self.taurus.receive(Packet(Packet(tester2).encode_delta(1, p1.dictify)))
+
+        expected = dict(key.dictify)
+        expected['speed'] = 42.0
+        assert self.taurus.data == json.dumps(expected)
+        assert len(self.taurus.history) == 2
+
+    def test_delta_transmitter(self):
+        frames = list()
+        keyframes = list()
+
+        server = Server(delta=True, keyframe_interval=3)
+        server._send_frame = lambda address, data: frames.append(data)
+        server._reliable._transmit = lambda address, data: keyframes.append(data) or len(keyframes)
+
+        def send(i):
+            tester = dict(test_packet[Packet.Type.DATA])
+            tester['gear'] = str(i)
+            server.send('0013A20000000000', Packet(tester))
+
+        def wait(size):
+            end = time.monotonic() + 1
+            while len(keyframes) < size and time.monotonic() < end:
+                time.sleep(0.001)
+            return len(keyframes)
+
+        # il keyframe parte senza bloccare: finche' non
+        # arriva l'ack partono pacchetti completi
+        send(0)
+        send(1)
+        assert wait(1) == 1 and Packet(keyframes[0]).keyframe
+        assert Packet(frames[0]).seq is None
+
+        server._reliable.status(1, True)
+        for i in range(2, 6):
+            send(i)
+        assert wait(2) == 2 and Packet(keyframes[1]).keyframe
+        assert len(frames) == 4
+        assert all(not Packet(raw).keyframe for raw in frames[1:])
+
+        for raw in keyframes[:1] + frames:
+            self.taurus.receive(Packet(raw))
+        assert json.loads(self.taurus.data)['gear'] == 4.0
+        server.close()
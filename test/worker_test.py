@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+from pyxbee import Server, Taurus, Packet
+from pyxbee.worker import DROP_NEWEST, ReceiveQueue
+
+from test import test_packet
+
+
+class _Message:
+    def __init__(self, data):
+        self.data = bytearray(data)
+
+
+class TestReceiveQueue:
+    """
+    Questo test puo' essere eseguito
+    con l'antenna NON collegata
+    """
+
+    def setup(self):
+        self.handled = []
+        self.ready = threading.Event()
+        self.started = threading.Event()
+
+    def _handler(self, raw):
+        # il primo pacchetto blocca il worker finche' serve
+        self.started.set()
+        self.ready.wait()
+        self.handled.append(raw)
+
+    def _queue(self, **kwargs):
+        queue = ReceiveQueue(self._handler, lambda raw: raw[0], maxsize=2,
+                             protected=('S',), preferred='D', **kwargs)
+        queue.put('B')
+        self.started.wait()
+        return queue
+
+    def test_drop_oldest(self):
+        queue = self._queue()
+        for raw in ('D1', 'X1', 'D2', 'S1', 'S2'):
+            queue.put(raw)
+
+        assert queue.depth == 2
+        assert queue.dropped_types == {'D': 2, 'X': 1}
+
+        # i tipi protetti superano il limite della coda
+        queue.put('S3')
+        assert queue.depth == 3 and queue.max_depth == 3
+        assert queue.dropped == 3
+
+        self.ready.set()
+        assert queue.join(1)
+        assert self.handled == ['B', 'S1', 'S2', 'S3']
+        queue.close()
+
+    def test_drop_newest(self):
+        queue = self._queue(policy=DROP_NEWEST)
+        for raw in ('D1', 'X1', 'D2', 'S1'):
+            queue.put(raw)
+
+        assert queue.dropped == 2
+        assert queue.dropped_types == {'D': 2}
+
+        self.ready.set()
+        queue.close()
+        assert self.handled == ['B', 'X1', 'S1']
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            ReceiveQueue(self._handler, str, policy='block')
+
+        with pytest.raises(ValueError):
+            ReceiveQueue(self._handler, str, workers=0)
+
+    def test_peek_type(self):
+        for tipo, content in test_packet.items():
+            packet = Packet(dict(content))
+            assert Packet.peek_type(packet.encode) == tipo
+            assert Packet.peek_type(packet.encode.encode('utf-8')) == tipo
+            assert Packet.peek_type(packet.encode_binary) == tipo
+
+        assert Packet.peek_type(b'') is None
+        assert Packet.peek_type(b'X') is None
+
+    def test_transmitter(self):
+        server = Server(workers=2)
+        taurus = Taurus('X', 'listenerX', server=server)
+
+        data = Packet(dict(test_packet[Packet.Type.DATA]))
+        server.receiver(_Message(data.encode.encode('utf-8')))
+
+        assert server.receive_queue.join(1)
+        assert server.receive_queue.received == 1
+        assert taurus.data == data.jsonify
+
+        server.close()
+        assert server.receive_queue is None
+
+    def test_keyframe(self):
+        server = Server(workers=1, receive_queue=1)
+        queue = server.receive_queue
+        queue._handler = self._handler
+
+        content = dict(test_packet[Packet.Type.DATA])
+        keyframe = Packet(content).encode_keyframe(1)
+        delta = Packet(content).encode_delta(1, Packet(content).dictify)
+
+        # i keyframe non vengono scartati per far posto ai delta
+        server.receiver(_Message(b'B'))
+        self.started.wait()
+        for raw in (keyframe, delta, delta):
+            server.receiver(_Message(raw))
+        assert queue.dropped == 1
+
+        self.ready.set()
+        assert queue.join(1)
+        assert self.handled[1:] == [keyframe, delta]
+        server.close()